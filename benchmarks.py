@@ -0,0 +1,348 @@
+"""
+This file times the vectorized helpers in functions.py against the per-row code they replaced.
+
+Every part builds synthetic data, checks that both versions give the same values and logs how long each one takes.
+"""
+
+# Imports
+import io
+import logging as LOGGER
+import timeit
+import warnings
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+from functions import (OLS_BACKENDS, SeasonRegistry, build_season_index, clean_stats_columns, create_summary_df,
+                       elastic_net_path, fit_ols, fit_ols_groups, lookup_season_rows, parse_contract_columns,
+                       parse_schedule_html, read_html_table, skip_after_misses)
+
+# Setup
+pd.options.display.max_rows = 500
+pd.options.display.max_columns = 500
+LOGGER.getLogger().setLevel(LOGGER.INFO)
+
+# Configurations
+CONTRACT_ROWS = 200000  # rows of synthetic contracts for the cleaning benchmark
+PAGE_ROWS = 5000  # contracts on the synthetic spotrac page for the HTML benchmark
+SCHEDULE_PAGES = 32  # synthetic ESPN schedule pages, one per team
+REGRESSION_ROWS = 500  # players in the synthetic regression data, about the size of the spotrac training set
+SUBSET_FITS = 200  # random feature subsets fitted by every OLS backend
+PATH_FEATURES = [10, 20, 40, 80, 160]  # numbers of features for the lasso path benchmark
+BATCH_ROWS = 5000  # players in the synthetic data for the batch models, spread over seasons, positions and lengths
+LEGACY_CONTRACTS = 300  # synthetic contracts matched to the Data/ seasons by the legacy loop, per seed
+LEGACY_SEEDS = 10  # sets of synthetic contracts checked against the legacy loop
+REPEATS = 3  # every version is timed this many times and the fastest run is reported
+SEED = 0
+
+rng = np.random.default_rng(SEED)
+
+"""
+PART 1: Cleaning the contract and stats columns.########################################################################
+"""
+
+# Synthetic contracts in the spotrac format, with dashes in some names, and stats with missing percentages
+first_names = np.array(["Oliver", "Sidney", "Connor", "Erik", "Pierre-Luc", "Jean"])
+last_names = np.array(["Ekman-Larsson", "Crosby", "McDavid", "Karlsson", "Dubois", "Van Riemsdyk"])
+signing_years = rng.integers(2008, 2022, CONTRACT_ROWS)
+contracts_df = pd.DataFrame({
+    'Player': [f"{first} {last} {position} | {year}-{year + length} (FA: {year + length})"
+               for first, last, position, year, length in zip(rng.choice(first_names, CONTRACT_ROWS),
+                                                              rng.choice(last_names, CONTRACT_ROWS),
+                                                              rng.choice(["C", "L", "R", "D"], CONTRACT_ROWS),
+                                                              signing_years, rng.integers(1, 9, CONTRACT_ROWS))],
+    'Signed Age': rng.integers(18, 40, CONTRACT_ROWS),
+    'AAV': [f"${aav:,}" for aav in rng.integers(700000, 13000000, CONTRACT_ROWS)],
+    'TOI/GP': [f"{minutes}:{seconds:02d}" for minutes, seconds in zip(rng.integers(5, 30, CONTRACT_ROWS),
+                                                                      rng.integers(0, 60, CONTRACT_ROWS))],
+    'S%': pd.Series(rng.uniform(0, 25, CONTRACT_ROWS).round(1), dtype=object).where(rng.random(CONTRACT_ROWS) > 0.05,
+                                                                                    '--'),
+    'FOW%': pd.Series(rng.uniform(30, 65, CONTRACT_ROWS).round(1), dtype=object).where(rng.random(CONTRACT_ROWS) > 0.5,
+                                                                                       '--')})
+LOGGER.info(f"Built {CONTRACT_ROWS} synthetic contracts")
+
+
+def clean_per_row():
+    '''
+    The per-row cleaning that salary_prediction.py used before parse_contract_columns and clean_stats_columns.
+    :return: a cleaned copy of contracts_df
+    '''
+    output_df = contracts_df.copy()
+    output_df['Signing Year'] = output_df['Player'].apply(lambda info: (((info.split('-'))[-2:-1])[0])[-4:]).astype(int)
+    output_df['Player'] = output_df['Player'].apply(lambda info: (info.split(" "))[0] + " " + (info.split(" "))[1])
+    output_df['AAV'] = output_df['AAV'].apply(lambda aav: (int("".join(aav.strip("$").split(","))) / 1000000))
+    output_df['TOI/GP'] = output_df['TOI/GP'].apply(
+        lambda time: int(time.split(":")[0]) + (int(time.split(":")[1]) / 60))
+    output_df['S%'] = output_df['S%'].replace({'--': 0})
+    output_df['FOW%'] = output_df['FOW%'].replace({'--': 0})
+    output_df['Signed Age'] = output_df['Signed Age'].astype(int)
+    return output_df
+
+
+def clean_vectorized():
+    '''
+    The cleaning stage from functions.py.
+    :return: a cleaned copy of contracts_df
+    '''
+    return clean_stats_columns(parse_contract_columns(contracts_df))
+
+
+# Both versions must agree before they are timed
+per_row_df = clean_per_row()
+vectorized_df = clean_vectorized()
+assert (per_row_df['Player'] == vectorized_df['Player']).all()
+assert (per_row_df['Signing Year'] == vectorized_df['Signing Year']).all()
+for column in ['AAV', 'TOI/GP', 'S%', 'FOW%', 'Signed Age']:
+    assert np.allclose(per_row_df[column].astype(float), vectorized_df[column], rtol=1e-6), column
+
+cleaned_columns = ['Signing Year', 'AAV', 'TOI/GP', 'S%', 'FOW%', 'Signed Age']
+per_row_time = min(timeit.repeat(clean_per_row, number=1, repeat=REPEATS))
+vectorized_time = min(timeit.repeat(clean_vectorized, number=1, repeat=REPEATS))
+LOGGER.info(f"Cleaning {CONTRACT_ROWS} contracts: per row {per_row_time:.2f}s, vectorized {vectorized_time:.2f}s "
+            f"({per_row_time / vectorized_time:.1f}x faster)")
+LOGGER.info(f"Memory of the cleaned columns: per row {per_row_df[cleaned_columns].memory_usage(deep=True).sum():,} "
+            f"bytes, vectorized {vectorized_df[cleaned_columns].memory_usage(deep=True).sum():,} bytes")
+
+"""
+PART 2: Reading the tables from the spotrac and ESPN pages. ############################################################
+"""
+
+# Synthetic pages in the shape of the real ones: navigation tables and scripts around the wanted table, links inside the
+# cells, and on ESPN a header row made of <td> cells followed by a long footer after the schedule
+page_players = contracts_df['Player'].iloc[:PAGE_ROWS].str.split(" | ", regex=False).str[0]
+page_rows = "".join(f'<tr><td>{rank}</td><td><a href="/player/{rank}">{player}</a></td><td>{age}</td>'
+                    f'<td>{aav}</td></tr>\n' for rank, player, age, aav in zip(range(1, PAGE_ROWS + 1), page_players,
+                                                      contracts_df['Signed Age'], contracts_df['AAV']))
+navigation = "<table><tr><td><a href='/nhl'>NHL</a></td><td><a href='/nfl'>NFL</a></td></tr></table>\n"
+spotrac_page = (f"<html><head><script>var tables = [];</script></head><body>{navigation * 20}"
+                f"<table class='datatable'><thead><tr><th>Rank</th><th>Player</th><th>Signed Age</th><th>AAV</th></tr>"
+                f"</thead><tbody>{page_rows}</tbody></table></body></html>").encode()
+
+game_days = pd.date_range("2021-10-12", "2022-04-29").strftime("%a, %b %-d")
+schedule_pages = []
+for team in range(SCHEDULE_PAGES):
+    days = np.sort(rng.choice(len(game_days), 82, replace=False))
+    rows = "".join(f"<tr><td>{game_days[day]}</td><td>vs <a href='/team/{day % 32}'>OPP</a></td><td>7:00 PM</td>"
+                   f"<td>ESPN+</td></tr>" for day in days)
+    schedule_pages.append((f"<html><body>{navigation * 20}<table><tr><td>DATE</td><td>OPPONENT</td><td>TIME</td>"
+                           f"<td>TV</td></tr>{rows}</table><div>{'<p><a href=/news>Footer link</a></p>' * 2000}</div>"
+                           f"</body></html>").encode())
+LOGGER.info(f"Built a spotrac page with {PAGE_ROWS} contracts and {SCHEDULE_PAGES} ESPN schedule pages")
+
+
+def read_spotrac_pandas():
+    return pd.read_html(io.BytesIO(spotrac_page))[-1]
+
+
+def read_spotrac_incremental():
+    return read_html_table(spotrac_page)
+
+
+def read_schedules_pandas():
+    '''
+    The schedule parsing that functions.py used before parse_schedule_html streamed the pages.
+    :return: a list with every team's schedule
+    '''
+    schedules = []
+    for page in schedule_pages:
+        schedule_df = pd.read_html(io.BytesIO(page))[-1]
+        new_header = schedule_df.iloc[0]
+        schedule_df = schedule_df[1:]
+        schedule_df.columns = new_header
+        schedules.append(schedule_df)
+    return schedules
+
+
+def read_schedules_incremental():
+    return [parse_schedule_html(page) for page in schedule_pages]
+
+
+# Both versions must agree before they are timed
+pd.testing.assert_frame_equal(read_spotrac_pandas(), read_spotrac_incremental())
+for pandas_df, incremental_df in zip(read_schedules_pandas(), read_schedules_incremental()):
+    assert list(pandas_df.columns) == list(incremental_df.columns)
+    assert (pandas_df.to_numpy() == incremental_df.to_numpy()).all()
+
+for name, pandas_version, incremental_version in [("the spotrac page", read_spotrac_pandas, read_spotrac_incremental),
+                                                  (f"{SCHEDULE_PAGES} ESPN pages", read_schedules_pandas,
+                                                   read_schedules_incremental)]:
+    pandas_time = min(timeit.repeat(pandas_version, number=1, repeat=REPEATS))
+    incremental_time = min(timeit.repeat(incremental_version, number=1, repeat=REPEATS))
+    LOGGER.info(f"Reading {name}: pd.read_html {pandas_time:.3f}s, read_html_table {incremental_time:.3f}s "
+                f"({pandas_time / incremental_time:.1f}x faster)")
+
+"""
+PART 3: Fitting OLS models in the subset search. #######################################################################
+"""
+
+# Synthetic stats with the same exact collinearity as the real ones (P = G + A, EVP = EVG + EVA), and a salary that is
+# linear in a few of them plus noise
+n_features = 12
+regression_stats = rng.poisson(rng.uniform(1, 30, n_features), (REGRESSION_ROWS, n_features)).astype(float)
+regression_stats[:, 2] = regression_stats[:, 0] + regression_stats[:, 1]
+regression_stats[:, 5] = regression_stats[:, 3] + regression_stats[:, 4]
+regression_salaries = regression_stats[:, [0, 1, 6, 7]] @ [0.08, 0.05, 0.02, 0.01] + rng.normal(0, 1, REGRESSION_ROWS)
+subsets = [np.flatnonzero(rng.random(n_features) < 0.5) for _ in range(SUBSET_FITS)]
+subsets = [subset for subset in subsets if len(subset)] + [np.arange(n_features), np.array([0, 1, 2])]
+collinear = [{0, 1, 2} <= set(subset) or {3, 4, 5} <= set(subset) for subset in subsets]
+
+
+def fit_subsets(backend, subsets):
+    '''
+    Fits every subset with one OLS backend.
+    :param backend (str): a name in OLS_BACKENDS
+    :param subsets (list): the column positions of every subset
+    :return: a list with the coefficients of every subset
+    '''
+    return [fit_ols(regression_stats[:, subset], regression_salaries, backend=backend) for subset in subsets]
+
+
+# Every backend must give the statsmodels coefficients, including the subsets with collinear features where the
+# coefficients are the minimum norm solution
+with warnings.catch_warnings():
+    warnings.simplefilter('ignore')  # statsmodels warns about every collinear subset
+    reference = [sm.OLS(regression_salaries, regression_stats[:, subset]).fit().params for subset in subsets]
+    for backend in OLS_BACKENDS:
+        for subset, expected, coefficients in zip(subsets, reference, fit_subsets(backend, subsets)):
+            assert np.allclose(coefficients, expected, rtol=1e-6, atol=1e-9), (backend, subset)
+
+    for name, group in [("full rank", [s for s, c in zip(subsets, collinear) if not c]),
+                        ("collinear", [s for s, c in zip(subsets, collinear) if c])]:
+        fit_times = {backend: min(timeit.repeat(lambda: fit_subsets(backend, group), number=1, repeat=REPEATS))
+                     for backend in OLS_BACKENDS}
+        LOGGER.info(f"Time per OLS fit of {len(group)} {name} subsets on {REGRESSION_ROWS} rows: " +
+                    ", ".join(f"{backend} {fit_time / len(group) * 1e6:.0f}us"
+                              for backend, fit_time in fit_times.items()))
+
+"""
+PART 4: Lasso paths as the number of features grows. ###################################################################
+"""
+
+# An exhaustive subset search doubles its time with every feature, the lasso path should only grow linearly
+for n_path_features in PATH_FEATURES:
+    path_stats = rng.normal(size=(REGRESSION_ROWS, n_path_features))
+    path_salaries = path_stats[:, :5] @ [1.0, 0.8, 0.6, 0.4, 0.2] + rng.normal(0, 1, REGRESSION_ROWS)
+    names = [f"Stat {j}" for j in range(n_path_features)]
+    path_time = min(timeit.repeat(lambda: elastic_net_path(path_stats, path_salaries, names), number=1,
+                                  repeat=REPEATS))
+    LOGGER.info(f"Lasso path with 100 penalties for {n_path_features} features: {path_time:.3f}s")
+
+"""
+PART 5: Fitting one model per season, position and contract length. ####################################################
+"""
+
+# Full rank synthetic stats with two targets, the AAV and the AAV as a share of a growing salary cap
+batch_features = [f"Stat {j}" for j in [0, 1, 3, 4, 6, 7, 8]]
+batch_stats = rng.poisson(rng.uniform(1, 30, len(batch_features)), (BATCH_ROWS, len(batch_features))).astype(float)
+batch_df = pd.DataFrame(batch_stats, columns=batch_features)
+batch_df['Stats Year'] = rng.integers(2008, 2020, BATCH_ROWS)
+batch_df['Pos'] = rng.choice(["C", "L", "R", "D"], BATCH_ROWS)
+batch_df['Contract Years'] = rng.integers(1, 9, BATCH_ROWS)
+batch_df['AAV'] = batch_stats[:, :4] @ [0.08, 0.05, 0.02, 0.01] + rng.normal(0, 1, BATCH_ROWS)
+batch_df['Cap Hit %'] = 100 * batch_df['AAV'] / (56.7 + 2.5 * (batch_df['Stats Year'] - 2008))
+batch_targets = ['AAV', 'Cap Hit %']
+batch_groupings = {'All Players': None, 'Stats Year': 'Stats Year', 'Position': 'Pos',
+                   'Contract Length': 'Contract Years', 'Season and Position': ['Stats Year', 'Pos']}
+
+
+def fit_groups_per_model():
+    '''
+    Fits every grouping, group and target with its own statsmodels model.
+    :return: a list with the coefficients, R2 and MAE of every model, in the order of fit_ols_groups
+    '''
+    results = []
+    for columns in batch_groupings.values():
+        groups = [("All", batch_df)] if columns is None else batch_df.groupby(columns, sort=True)
+        for _, group_df in groups:
+            for target in batch_targets:
+                result = sm.OLS(group_df[target].values, group_df[batch_features].values).fit()
+                results.append((result.params, result.rsquared, np.abs(result.resid).mean()))
+    return results
+
+
+batched = fit_ols_groups(batch_df, batch_features, batch_targets, batch_groupings)
+for (_, model_df), (coefficients, r2, mae) in zip(batched.groupby(['Grouping', 'Group', 'Target'], sort=False),
+                                                  fit_groups_per_model()):
+    assert np.allclose(model_df['Coefficient'], coefficients, rtol=1e-6, atol=1e-9)
+    assert np.isclose(model_df['R2'].iloc[0], r2) and np.isclose(model_df['MAE'].iloc[0], mae)
+
+n_models = len(batched) // len(batch_features)
+loop_time = min(timeit.repeat(fit_groups_per_model, number=1, repeat=REPEATS))
+batch_time = min(timeit.repeat(lambda: fit_ols_groups(batch_df, batch_features, batch_targets, batch_groupings),
+                               number=1, repeat=REPEATS))
+LOGGER.info(f"Fitting {n_models} grouped models on {BATCH_ROWS} rows: one statsmodels fit per model {loop_time:.3f}s, "
+            f"batched {batch_time:.3f}s ({loop_time / batch_time:.1f}x faster)")
+
+"""
+PART 6: Matching the legacy contracts to season stats. #################################################################
+"""
+
+# The files the old per-row loop of salary_prediction_old.py read for every signing year. It had no 2009 branch, and it
+# read the 2017 files for 2018 contracts
+legacy_files = {2008: '08', 2010: '10', 2011: '11', 2012: '12', 2013: '12', 2014: '14', 2015: '15', 2016: '16',
+                2017: '17', 2018: '17', 2019: '19', 2020: '19'}
+legacy_summaries = {short_year: create_summary_df(short_year) for short_year in set(legacy_files.values())}
+legacy_seasons = {year: legacy_summaries[short_year] for year, short_year in legacy_files.items()}
+legacy_columns = ['Player', 'Pos', 'GP', 'G', 'A', 'S%', '+/-', 'TOI/GP', 'PPP', 'S']
+
+# The same seasons through the registry, as salary_prediction_old.py loads them now
+legacy_stats_years = {year: 2012 if year == 2013 else 2019 if year == 2020 else year for year in legacy_files}
+legacy_registry = SeasonRegistry()
+legacy_registry.register(2018, lambda: create_summary_df('17'))
+
+
+def match_per_row(nhl_data):
+    '''
+    Matches the contracts the way the old loop did, with its ten copies of the season branch folded into one: a player
+    is looked for in the whole season, and the contract after every player that is not found is skipped.
+    :param nhl_data (pd.Dataframe): contracts with Player, Year Signed and AAV columns, one per player
+    :return: a dataframe with the stats and AAV of every matched contract
+    '''
+    matched_rows = []
+    i = 0
+    while i < nhl_data['Player'].size:
+        signing_year = nhl_data['Year Signed'][i]
+        player = nhl_data['Player'][i]
+        if signing_year in legacy_seasons:
+            season_df = legacy_seasons[signing_year]
+            if season_df.isin([player]).any().any():
+                index = np.where(season_df['Player'] == player)[0][0]
+                index_sal = np.where(nhl_data['Player'] == player)[0][0]
+                matched_rows.append([season_df[column][index] for column in legacy_columns] +
+                                    [nhl_data['AAV'][index_sal]])
+            else:
+                i = i + 1
+        i = i + 1
+    return pd.DataFrame(matched_rows, columns=legacy_columns + ['AAV'])
+
+
+def match_indexed(nhl_data):
+    '''
+    Matches the contracts like salary_prediction_old.py does now, with one index lookup and skip_after_misses.
+    :param nhl_data (pd.Dataframe): contracts with Player, Year Signed and AAV columns, one per player
+    :return: a dataframe with the stats and AAV of every matched contract
+    '''
+    stats_years = nhl_data['Year Signed'].map(legacy_stats_years)
+    season_index = build_season_index(legacy_registry.load(stats_years.dropna()))
+    rows = lookup_season_rows(season_index, stats_years, nhl_data['Player'])
+    matched = (rows != -1) & ~skip_after_misses(stats_years.notna().to_numpy() & (rows == -1))
+    output_df = season_index.iloc[rows[matched]][legacy_columns].reset_index(drop=True)
+    output_df['AAV'] = nhl_data['AAV'][matched].reset_index(drop=True)
+    return output_df
+
+
+# Players from the season of their signing year mixed with unknown ones, so there are runs of misses of every length,
+# and signing years with no stats
+for seed in range(LEGACY_SEEDS):
+    legacy_rng = np.random.default_rng(seed)
+    years = legacy_rng.integers(2007, 2023, LEGACY_CONTRACTS)
+    players = [legacy_rng.choice(legacy_seasons[year]['Player']) if year in legacy_seasons and legacy_rng.random() < 0.6
+               else f"Unknown Player{j}" for j, year in enumerate(years)]
+    nhl_data = pd.DataFrame({'Player': players, 'Year Signed': years,
+                             'AAV': [f"${aav:,}" for aav in legacy_rng.integers(700000, 13000000, LEGACY_CONTRACTS)]})
+    nhl_data = nhl_data.drop_duplicates(subset='Player', keep='first').reset_index(drop=True)
+    pd.testing.assert_frame_equal(match_indexed(nhl_data), match_per_row(nhl_data), check_dtype=False)
+
+per_row_time = min(timeit.repeat(lambda: match_per_row(nhl_data), number=1, repeat=REPEATS))
+indexed_time = min(timeit.repeat(lambda: match_indexed(nhl_data), number=1, repeat=REPEATS))
+LOGGER.info(f"Matching {len(nhl_data)} legacy contracts ({LEGACY_SEEDS} seeds checked): per row {per_row_time:.3f}s, "
+            f"indexed {indexed_time:.3f}s ({per_row_time / indexed_time:.1f}x faster)")
@@ -1,96 +1,2586 @@
 """
-This file stores all functions used in relative_age_effect.py, salary_prediction.py, fantasy_goalies.py
+This file stores all functions used in relative_age_effect.py, salary_prediction.py, schedule.py
 """
 
+import codecs
+import functools
+import hashlib
+import heapq
+import itertools
+import json
 import logging as LOGGER
+import multiprocessing
+import os
+import re
+import tempfile
+import time
+import numpy as np
+import openpyxl
 import pandas as pd
+import requests
+from collections import OrderedDict
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from lxml import etree
+from multiprocessing import shared_memory
+from requests.adapters import HTTPAdapter
+from scipy import linalg
+from urllib3.util.retry import Retry
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # the cache is skipped and every workbook is read with openpyxl
+    feather = None
 
 LOGGER.getLogger().setLevel(LOGGER.INFO)
 
+# Labels of the birth quarters, and the position of each month's quarter in that list (index 0 is unused)
+BIRTH_QUARTERS = ["Q1 = Jan-Mar", "Q2 = Apr-Jun", "Q3 = Jul-Sep", "Q4 = Oct-Dec"]
+_MONTH_TO_QUARTER = np.array([-1, 0, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3], dtype=np.int8)
+
+# Average number of days in every month, the share of births expected in each month if birthdays were random
+DAYS_IN_MONTH = np.array([31, 28.25, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+# The resampling tests draw at most this many player indices at once, which keeps every chunk around 16MB
+RESAMPLE_CELLS = 2 ** 22
+
+# Folder for the Feather copies of the Excel files in Data/
+CACHE_DIR = "Data/.cache"
+
+# Folder for the downloaded salary pages, and how many seconds a download is used before the server is asked again
+SALARY_CACHE_DIR = "Data/.cache/salaries"
+SALARY_MAX_AGE = 24 * 60 * 60
+
+# Where salary_prediction.py saves the chosen model for predict_salary, and the version of the saved format
+SALARY_MODEL_PATH = "Data/salary_model.json"
+SALARY_MODEL_FORMAT = 1
+
+# Stats columns that NHL.com gives as "MM:SS", and the ones that use '--' for a missing percentage
+MINUTES_COLUMNS = ['TOI/GP']
+MISSING_AS_ZERO_COLUMNS = ['S%', 'FOW%']
+
+# Text that read_html_table treats as a missing value, the same text pd.read_html treats as missing
+_MISSING_TEXT = frozenset(['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                           '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'])
+_HTML_WHITESPACE = re.compile(r"[\r\n]+|\s{2,}")
+_HIDDEN_STYLE = re.compile(r"display:\s*none")
+
+# Memory that a SeasonRegistry may keep loaded seasons in before it drops the least recently used ones
+SEASON_CACHE_BYTES = 256 * 2 ** 20
+
+# Feather columns can only hold one type, so object columns that mix numbers and text (ie. '--' in FOW%) are stored as
+# one column per Python type. Maps the type name to the Feather column dtype and the Python type to restore.
+_MIXED_KINDS = {'int': ('Int64', int), 'float': ('float64', float), 'str': ('string', str)}
+
+# The subset search rebuilds its swept matrix every REFRESH_INTERVAL subsets. Parallel chunks start on these boundaries
+# so they produce exactly the same numbers as a serial run.
+REFRESH_INTERVAL = 1024
+
+# Arrays that a worker process attached to from shared memory, set by _attach_shared_arrays
+_shared_arrays = {}
+
+
+def add_birth_date_features(bio_info):
+    '''
+    Parses every birthday once and adds the birth month, quarter and year as compact columns.
+    :param bio_info (pd.Dataframe): player data with a DOB column in the form YYYY-MM-DD
+    :return: a copy of bio_info with the columns 'Birth Months' (int8, 1 to 12), 'Birth Quarter' (categorical, ie.
+    "Q2 = Apr-Jun") and 'Birth Year' (int16)
+
+    Example:
+    add_birth_date_features(bio_info) -> DOB: 2021-04-18, Birth Months: 4, Birth Quarter: "Q2 = Apr-Jun",
+    Birth Year: 2021
+    '''
+    dob = pd.to_datetime(bio_info['DOB'], format='%Y-%m-%d')
+    months = dob.dt.month.to_numpy(dtype=np.int8)
+
+    output_df = bio_info.copy()
+    output_df['Birth Months'] = months
+    output_df['Birth Quarter'] = pd.Categorical.from_codes(_MONTH_TO_QUARTER[months], categories=BIRTH_QUARTERS)
+    output_df['Birth Year'] = dob.dt.year.to_numpy(dtype=np.int16)
+    return output_df
+
+
+def _safe_divide(numerator, denominator):
+    '''
+    Divides two arrays element by element, giving 0 wherever the denominator is 0.
+    :param numerator (np.ndarray): the values to divide
+    :param denominator (np.ndarray): the values to divide by
+    :return: an array of floats
+    '''
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator != 0)
+
+
+def cohort_mask(bio_info, filters):
+    '''
+    Finds the players that pass every filter of a cohort.
+    :param bio_info (pd.Dataframe): player data
+    :param filters (dict): the keys are columns and the values are a single value to match, a list of values to match
+    or a function that takes the column and returns a boolean Series
+    :return: a boolean array with one value per player
+    '''
+    mask = np.ones(len(bio_info), dtype=bool)
+    for column, condition in filters.items():
+        if callable(condition):
+            matches = condition(bio_info[column])
+        elif isinstance(condition, (list, tuple, set, range)):
+            matches = bio_info[column].isin(condition)
+        else:
+            matches = bio_info[column] == condition
+        mask &= np.asarray(matches, dtype=bool)
+    return mask
+
+
+def calculate_cohort_cubes(bio_info, cohorts):
+    '''
+    Counts players, points and games for every birth year and month of several cohorts in a single pass over the data.
+    A player can be in any number of cohorts. Every cohort covers the same years, from the oldest to the youngest
+    player in bio_info, so the cohorts can be compared year by year.
+    :param bio_info (pd.Dataframe): provides the data for birthdays (DOB as YYYY-MM-DD), games played, points and the
+    filtered columns. The birthdays are only parsed if add_birth_date_features has not been run on it yet
+    :param cohorts (dict): the keys are the names of the cohorts and the values are their filters, where every filter
+    maps a column to a value, a list of values or a function returning a boolean Series. {} keeps every player
+    :return: a dataframe indexed by (Cohort, Birth Year, Birth Month) with the columns 'Players', 'P', 'GP' and 'PPG'
+    (0 where no games were played)
+
+    Example:
+    calculate_cohort_cubes(bio_info, {'All': {}, 'Defence': {'Pos': 'D'},
+                                      'Debuted since 2015-16': {'1st Season': lambda season: season >= 20152016}})
+    -> .loc[('Defence', 1987, 2)] -> Players: 1, P: 150, GP: 700, PPG: 0.21
+    '''
+    if 'Birth Year' not in bio_info or 'Birth Months' not in bio_info:
+        bio_info = add_birth_date_features(bio_info)
+    years = bio_info['Birth Year'].to_numpy(dtype=np.int64)
+    months = bio_info['Birth Months'].to_numpy(dtype=np.int64)
+    first_year, last_year = years.min(), years.max()
+    n_cells = (last_year - first_year + 1) * 12
+    n_total = len(cohorts) * n_cells
+
+    # One (player, cohort) pair for every membership, so all cohorts are counted by the same bincount calls
+    membership = np.column_stack([cohort_mask(bio_info, filters) for filters in cohorts.values()])
+    players, cohort_ids = np.nonzero(membership)
+    cells = cohort_ids * n_cells + (years[players] - first_year) * 12 + (months[players] - 1)
+    points = np.bincount(cells, weights=bio_info['P'].to_numpy(dtype=float)[players], minlength=n_total)
+    games = np.bincount(cells, weights=bio_info['GP'].to_numpy(dtype=float)[players], minlength=n_total)
+
+    index = pd.MultiIndex.from_product([list(cohorts), range(first_year, last_year + 1), range(1, 13)],
+                                       names=['Cohort', 'Birth Year', 'Birth Month'])
+    cube = pd.DataFrame({'Players': np.bincount(cells, minlength=n_total),
+                         'P': points.round().astype(np.int64),
+                         'GP': games.round().astype(np.int64)}, index=index)
+    cube['PPG'] = _safe_divide(cube['P'], cube['GP'])
+    LOGGER.info(f"Built birth cubes of {len(cohorts)} cohorts for {len(bio_info)} players born "
+                f"{first_year}-{last_year}")
+    return cube
+
+
+def calculate_birth_cube(bio_info):
+    '''
+    Counts players, points and games for every birth year and month in a single pass over the data.
+    :param bio_info (pd.Dataframe): provides the data for birthdays (DOB as YYYY-MM-DD), games played and points. The
+    birthdays are only parsed if add_birth_date_features has not been run on it yet
+    :return: a dataframe indexed by (Birth Year, Birth Month) with a row for every month of every year from the oldest
+    to the youngest player, and the columns 'Players', 'P', 'GP' and 'PPG' (0 where no games were played)
+
+    Example:
+    calculate_birth_cube(bio_info).loc[(1987, 2)] -> Players: 4, P: 1210, GP: 2140, PPG: 0.57
+    '''
+    return calculate_cohort_cubes(bio_info, {'All': {}}).droplevel('Cohort')
+
+
+def rollup_birth_cube(cube, by):
+    '''
+    Adds up the cube from calculate_birth_cube or calculate_cohort_cubes over the dimensions that are not in by and
+    recalculates PPG.
+    :param cube (pd.Dataframe): the output of calculate_birth_cube or calculate_cohort_cubes
+    :param by (list): the dimensions to keep, out of the index levels of the cube ('Cohort', 'Birth Year',
+    'Birth Month') and 'Birth Quarter' (1 to 4)
+    :return: a dataframe indexed by the dimensions in by, with the columns 'Players', 'P', 'GP' and 'PPG'
+
+    Example:
+    rollup_birth_cube(cube, ['Birth Year', 'Birth Quarter']).loc[(1987, 1)] -> Players: 11, P: 2900, ...
+    '''
+    keys = {name: cube.index.get_level_values(name) for name in cube.index.names}
+    keys['Birth Quarter'] = pd.Index(_MONTH_TO_QUARTER[keys['Birth Month']] + 1)
+    rollup = cube[['Players', 'P', 'GP']].groupby([keys[dimension].rename(dimension) for dimension in by],
+                                                  sort=False).sum()
+    rollup['PPG'] = _safe_divide(rollup['P'], rollup['GP'])
+    return rollup
+
+
+def birth_month_chi_square(bio_info, expected_shares=None):
+    '''
+    Tests whether players are born in every month as often as random birthdays would be, with a chi-square test.
+    :param bio_info (pd.Dataframe): player data with birthdays (DOB as YYYY-MM-DD). The birthdays are only parsed if
+    add_birth_date_features has not been run on it yet
+    :param expected_shares (list): the expected share of births in every month, ie. from national birth statistics.
+    Defaults to the number of days in every month
+    :return: a dictionary with the observed and expected counts per month, the chi-square statistic, the degrees of
+    freedom and the p-value
+
+    Example:
+    birth_month_chi_square(bio_info) -> {'observed': [86, 80, ...], 'expected': [74.9, 68.2, ...], 'chi2': 21.3,
+    'dof': 11, 'p_value': 0.03}
+    '''
+    if 'Birth Months' not in bio_info:
+        bio_info = add_birth_date_features(bio_info)
+    observed = np.bincount(bio_info['Birth Months'].to_numpy(dtype=np.int64), minlength=13)[1:]
+    shares = np.asarray(DAYS_IN_MONTH if expected_shares is None else expected_shares, dtype=float)
+    expected = observed.sum() * shares / shares.sum()
+
+    from scipy import stats  # loaded here as it takes longer to import than the rest of this file
+    chi2 = float(((observed - expected) ** 2 / expected).sum())
+    dof = len(observed) - 1
+    return {'observed': observed.tolist(), 'expected': expected.tolist(), 'chi2': chi2, 'dof': dof,
+            'p_value': float(stats.chi2.sf(chi2, dof))}
+
+
+def _ppg_difference_chunk(points, games, n_first, method, size, seed):
+    '''
+    Resamples the difference in PPG between two groups of players as matrix operations, one resample per row.
+    :param points (np.ndarray): the points of every player, the first group followed by the second group
+    :param games (np.ndarray): the games played of every player, in the same order
+    :param n_first (int): the number of players in the first group
+    :param method (str): 'bootstrap' draws players with replacement within each group, 'permutation' shuffles the
+    players between the groups
+    :param size (int): the number of resamples
+    :param seed (np.random.SeedSequence): the seed of this chunk
+    :return: an array with the PPG of the first group minus the PPG of the second group in every resample
+    '''
+    rng = np.random.default_rng(seed)
+    n_total = len(points)
+    if method == 'bootstrap':
+        first = rng.integers(0, n_first, (size, n_first), dtype=np.int32)
+        second = rng.integers(n_first, n_total, (size, n_total - n_first), dtype=np.int32)
+        first_points, first_games = points[first].sum(axis=1), games[first].sum(axis=1)
+        second_points, second_games = points[second].sum(axis=1), games[second].sum(axis=1)
+    else:
+        # The players with the n_first smallest random keys form the first group, a uniformly random split
+        keys = rng.random((size, n_total), dtype=np.float32)
+        first = np.argpartition(keys, n_first - 1, axis=1)[:, :n_first]
+        first_points, first_games = points[first].sum(axis=1), games[first].sum(axis=1)
+        second_points, second_games = points.sum() - first_points, games.sum() - first_games
+    return _safe_divide(first_points, first_games) - _safe_divide(second_points, second_games)
+
+
+def quarter_ppg_test(bio_info, first=1, second=4, n_resamples=100000, confidence=0.95, seed=0, workers=1):
+    '''
+    Tests whether players born in one quarter score more points per game than players born in another. A bootstrap
+    gives a confidence interval for the difference in PPG and a permutation test gives its p-value. The resamples are
+    drawn in chunks with their own seeds, so the results only depend on seed, not on the number of workers.
+    :param bio_info (pd.Dataframe): player data with birthdays (DOB as YYYY-MM-DD), games played and points
+    :param first (int): the first quarter (1 to 4)
+    :param second (int): the quarter to compare it to (1 to 4)
+    :param n_resamples (int): the number of bootstrap and of permutation resamples
+    :param confidence (float): the coverage of the confidence interval
+    :param seed (int): the seed of the random numbers
+    :param workers (int): the number of processes to resample with (defaults to the number of CPUs). 1 runs serially
+    :return: a dictionary with the PPG of both quarters, their difference, the bounds of the confidence interval and
+    the two-sided p-value
+
+    Example:
+    quarter_ppg_test(bio_info) -> {'ppg_first': 0.41, 'ppg_second': 0.48, 'difference': -0.07, 'ci_low': -0.13,
+    'ci_high': -0.01, 'p_value': 0.02, ...}
+    '''
+    if 'Birth Months' not in bio_info:
+        bio_info = add_birth_date_features(bio_info)
+    quarters = _MONTH_TO_QUARTER[bio_info['Birth Months'].to_numpy(dtype=np.int64)] + 1
+    order = np.concatenate([np.flatnonzero(quarters == first), np.flatnonzero(quarters == second)])
+    n_first = int((quarters == first).sum())
+    points = bio_info['P'].to_numpy(dtype=float)[order]
+    games = bio_info['GP'].to_numpy(dtype=float)[order]
+    if n_first == 0 or n_first == len(order):
+        raise ValueError(f"Both quarters need players, found {n_first} in Q{first} and "
+                         f"{len(order) - n_first} in Q{second}")
+
+    # Split the resamples into chunks of at most RESAMPLE_CELLS player draws
+    chunk_size = max(1, min(n_resamples, RESAMPLE_CELLS // len(order)))
+    sizes = [min(chunk_size, n_resamples - start) for start in range(0, n_resamples, chunk_size)]
+    jobs = [(points, games, n_first, method, size, chunk_seed)
+            for method, method_seed in zip(['bootstrap', 'permutation'], np.random.SeedSequence(seed).spawn(2))
+            for size, chunk_seed in zip(sizes, method_seed.spawn(len(sizes)))]
+    if workers == 1:
+        differences = [_ppg_difference_chunk(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as executor:
+            differences = list(executor.map(_ppg_difference_chunk, *zip(*jobs)))
+    bootstrap = np.concatenate(differences[:len(sizes)])
+    permutation = np.concatenate(differences[len(sizes):])
+
+    ppg_first = float(_safe_divide(points[:n_first].sum(), games[:n_first].sum()))
+    ppg_second = float(_safe_divide(points[n_first:].sum(), games[n_first:].sum()))
+    difference = ppg_first - ppg_second
+    ci_low, ci_high = np.quantile(bootstrap, [(1 - confidence) / 2, (1 + confidence) / 2])
+    p_value = (np.count_nonzero(np.abs(permutation) >= abs(difference) - 1e-12) + 1) / (n_resamples + 1)
+    return {'n_first': n_first, 'n_second': len(order) - n_first, 'ppg_first': ppg_first, 'ppg_second': ppg_second,
+            'difference': difference, 'ci_low': float(ci_low), 'ci_high': float(ci_high), 'p_value': float(p_value)}
+
+
+def draw_month_bars(ax, values, labels, ylabel, title, decimals=None, ylim=None):
+    '''
+    Draws one labelled bar for every birth month (Plots 1 and 2 of relative_age_effect.py).
+    :param ax (matplotlib.axes.Axes): the axes to draw on
+    :param values (list): the height of every bar
+    :param labels (list): the name of every month
+    :param ylabel (str): the label of the y axis
+    :param title (str): the title of the plot
+    :param decimals (int): the number of decimals in the bar labels. None writes the values as they are
+    :param ylim (float): the top of the y axis. None fits it to the bars
+    :return: None
+    '''
+    x_index = np.arange(len(labels))
+    bars = ax.bar(x_index, values, align="center", alpha=0.9)
+    if ylim is not None:
+        ax.set_ylim(top=ylim)
+    ax.set_xticks(x_index)
+    ax.set_xticklabels(labels, fontsize=9)
+    ax.set_ylabel(ylabel)
+    ax.set_xlabel("Birth Month")
+    ax.set_title(title)
+
+    # Add labels
+    for i in x_index:
+        ax.annotate(str(values[i]) if decimals is None else round(values[i], decimals),
+                    xy=(bars[i].get_x() + 0.4, values[i]),
+                    xytext=(0, 0),
+                    textcoords='offset points',
+                    ha='center',
+                    va='bottom')
+
+
+def draw_quarter_bars(ax, quarters, years, ylabel, title, yticks=None):
+    '''
+    Draws four bars, one per birth quarter, for every birth year (Plots 3 and 4 of relative_age_effect.py).
+    :param ax (matplotlib.axes.Axes): the axes to draw on
+    :param quarters (list): four lists, one per quarter, with the height of the bar in every year
+    :param years (list): the birth years
+    :param ylabel (str): the label of the y axis
+    :param title (str): the title of the plot
+    :param yticks (list): the ticks of the y axis. None lets matplotlib pick them
+    :return: None
+    '''
+    x_index = np.arange(len(years))
+    width = 0.15
+    for offset, values, label in zip([-1.5, -0.5, 0.5, 1.5], quarters, BIRTH_QUARTERS):
+        ax.bar(x_index + offset * width, values, width, label=label)
+
+    ax.set_xticks(x_index)
+    ax.set_xticklabels(years, fontsize=11)
+    ax.set_ylabel(ylabel)
+    if yticks is not None:
+        ax.set_yticks(yticks)
+    ax.set_xlabel("Birth Year")
+    ax.set_title(title)
+    ax.legend(prop={'size': 15})
+    ax.figure.set_size_inches(18, 10)
 
-def calculate_quarter(birthday=""):
+
+def _render_plot(name, draw, kwargs, output_dir, formats):
+    '''
+    Draws one plot on an Agg canvas, so no display is needed, and saves it in every format.
+    :param name (str): the file name of the plot without an extension
+    :param draw (function): draws the plot on an axes, ie. draw_month_bars
+    :param kwargs (dict): the arguments of draw besides the axes
+    :param output_dir (str): the folder to save in
+    :param formats (list): the file extensions to save, ie. ['png', 'svg']
+    :return: the paths of the saved files
+    '''
+    from matplotlib.backends.backend_agg import FigureCanvasAgg  # matplotlib is only loaded by the plots
+    from matplotlib.figure import Figure
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    draw(figure.subplots(), **kwargs)
+    paths = []
+    for file_format in formats:
+        path = os.path.join(output_dir, f"{name}.{file_format}")
+        figure.savefig(path)
+        paths.append(path)
+    return paths
+
+
+def render_plots(plots, output_dir, formats=("png", "svg"), workers=None):
     '''
-    Determines the quarter in which a player was born in given their birthday.
-    :param birthday (str): a player's birthday in the form YYYY-MM-DD
-    :return: a string describing the quarter the player was born in
+    Saves plots to files without opening any windows, drawing them on a process pool.
+    :param plots (dict): the keys are the file names and the values are (draw function, arguments) pairs
+    :param output_dir (str): the folder to save in, created if it does not exist
+    :param formats (list): the file extensions to save
+    :param workers (int): the number of processes to draw with (defaults to the number of CPUs). 1 draws serially
+    :return: the paths of the saved files
 
     Example:
-    calculate_quarter(2021-04-18) -> "Q2 = Apr-Jun"
+    render_plots({'plot_1': (draw_month_bars, {'values': [...], ...})}, "Plots") -> ['Plots/plot_1.png', ...]
     '''
-    month = int(birthday[5:7])
-    if month <= 3:
-        return "Q1 = Jan-Mar"
-    elif month <= 6:
-        return "Q2 = Apr-Jun"
-    elif month <= 9:
-        return "Q3 = Jul-Sep"
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(name, draw, kwargs, output_dir, formats) for name, (draw, kwargs) in plots.items()]
+    if workers == 1 or len(jobs) < 2:
+        paths = [_render_plot(*job) for job in jobs]
     else:
-        return "Q4 = Oct-Dec"
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as executor:
+            paths = list(executor.map(_render_plot, *zip(*jobs)))
+    LOGGER.info(f"Saved {len(jobs)} plots to {output_dir}")
+    return [path for plot_paths in paths for path in plot_paths]
+
+
+def _file_sha256(path):
+    '''
+    Calculates the SHA-256 hash of a file.
+    :param path (str): the path of the file
+    :return: the hash as a hex string
+    '''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _encode_mixed_columns(df):
+    '''
+    Splits the object columns that mix numbers and text into one typed column per Python type.
+    :param df (pd.Dataframe): the dataframe read from Excel
+    :return: the encoded dataframe and the list of split columns, or (None, None) if a column cannot be split
+    '''
+    encoded = {}
+    mixed = []
+    for column in df.columns:
+        values = df[column]
+        kinds = values.map(lambda value: type(value).__name__) if values.dtype == object else None
+        if kinds is None or kinds.nunique() <= 1:
+            encoded[str(column)] = values
+            continue
+        if not set(kinds).issubset(_MIXED_KINDS):
+            return None, None
+        mixed.append(str(column))
+        for kind, (dtype, _) in _MIXED_KINDS.items():
+            encoded[f"{column}#{kind}"] = values.where(kinds == kind).astype(dtype)
+    return pd.DataFrame(encoded), mixed
+
+
+def _decode_mixed_columns(df, columns, mixed):
+    '''
+    Rebuilds the object columns that _encode_mixed_columns split apart.
+    :param df (pd.Dataframe): the dataframe read from Feather
+    :param columns (list): the original column order
+    :param mixed (list): the columns that were split
+    :return: the dataframe as it was read from Excel
+    '''
+    for column in mixed:
+        values = np.full(len(df), np.nan, dtype=object)
+        for kind, (_, python_type) in _MIXED_KINDS.items():
+            part = df.pop(f"{column}#{kind}")
+            present = part.notna().to_numpy()
+            values[present] = [python_type(value) for value in part[present]]
+        df[column] = values
+    return df[columns]
+
+
+def _replace_file(path, write):
+    '''
+    Writes a file through a temporary file in the same folder and then moves it into place, so a run that is killed
+    mid-write, or another process writing the same file, never leaves a partial file behind.
+    :param path (str): the path of the file
+    :param write (function): takes the temporary path and writes the file there
+    :return: the os.stat of the written file (a move keeps its modified time and size)
+    '''
+    folder = os.path.dirname(path) or '.'
+    os.makedirs(folder, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=folder, prefix=os.path.basename(path), suffix='.tmp')
+    os.close(handle)
+    try:
+        write(temp_path)
+        stat = os.stat(temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return stat
+
+
+def _write_json(data, path):
+    '''
+    Saves a dictionary as JSON with _replace_file.
+    :param data (dict): the dictionary
+    :param path (str): the path of the JSON file
+    :return: None
+    '''
+    def write(temp_path):
+        with open(temp_path, 'w') as file:
+            json.dump(data, file)
+    _replace_file(path, write)
+
+
+def _write_feather_copy(df, cache_path):
+    '''
+    Saves a dataframe as Feather, splitting the columns that mix numbers and text.
+    :param df (pd.Dataframe): the dataframe to save
+    :param cache_path (str): the path of the Feather file
+    :return: the column order and split columns that _read_feather_copy needs and the modified time and size of the
+    written file, or None if a column cannot be saved
+    '''
+    encoded, mixed = _encode_mixed_columns(df)
+    if encoded is None:
+        return None
+    stat = _replace_file(cache_path, lambda temp_path: feather.write_feather(encoded, temp_path))
+    return {'columns': [str(column) for column in df.columns], 'mixed': mixed,
+            'feather': [stat.st_mtime_ns, stat.st_size]}
 
 
-def calculate_ppg_by_qtr_yr(bio_info, year_range, qtr):
+def _read_feather_copy(cache_path, meta):
     '''
-    Creates a list of points per game for every birth year of all players born in a particular quarter.
-    :param bio_info (pd.Dataframe): provides the data for games played, points, and birth quarter
-    :param year_range [int, int]: the oldest and youngest years of birth, to create the length of the list
-    :param qtr (str): the desired quarter, such as "Q1 = Jan-Mar" (must be in this format)
-    :return: a list with the points per game
+    Reads a dataframe saved by _write_feather_copy.
+    :param cache_path (str): the path of the Feather file
+    :param meta (dict): the output of _write_feather_copy
+    :return: the dataframe as it was saved
     '''
-    # Create dictionaries where the keys are the birth years and values are all 0.
-    qtr_total_pts_dict = dict(
-        zip(range(year_range[0], year_range[1] + 1), [0] * (year_range[1] - year_range[0] + 1)))
-    qtr_total_gp_dict = dict(zip(range(year_range[0], year_range[1] + 1), [0] * (year_range[1] - year_range[0] + 1)))
-    qtr_info = bio_info[bio_info['Birth Quarter'] == qtr]
+    df = feather.read_table(cache_path, memory_map=True).to_pandas()
+    return _decode_mixed_columns(df, meta['columns'], meta['mixed'])
 
-    # Create a list of total points
-    pts_df = qtr_info.groupby('Birth Year').agg({'P': sum})
 
-    LOGGER.info(f"Points by year for {qtr}: {pts_df}")
+def _read_cache_meta(meta_path, cache_path):
+    '''
+    Reads the JSON that describes a Feather copy made by read_excel_cached.
+    :param meta_path (str): the path of the JSON file
+    :param cache_path (str): the path of the Feather file
+    :return: the dictionary, or None if either file is missing, the JSON is corrupt or it was written for another
+    Feather file (ie. by another process rebuilding the same copy), so the copy gets rebuilt
+    '''
+    try:
+        with open(meta_path) as file:
+            meta = json.load(file)
+        stat = os.stat(cache_path)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(meta, dict) or meta.get('feather') != [stat.st_mtime_ns, stat.st_size]:
+        return None
+    return meta
 
-    temp_dict = dict(zip(list(pts_df.index), list(pts_df['P'])))
-    for key in list(temp_dict.keys()):
-        qtr_total_pts_dict[key] = temp_dict[key]
-    qtr_total_pts_list = list(qtr_total_pts_dict.values())
 
-    # Create a list of total games
-    gp_df = qtr_info.groupby('Birth Year').agg({'GP': sum})
-    LOGGER.info(f"Games by year for {qtr}: {gp_df}")
+def read_excel_cached(path, cache_dir=CACHE_DIR):
+    '''
+    Reads an Excel file through a Feather copy in cache_dir. The copy is made on the first read and is used again as
+    long as the Excel file's modified time and size, or failing that its SHA-256 hash, are unchanged. Otherwise the copy
+    is rebuilt. Feather files are memory-mapped, so later runs skip openpyxl entirely. Copies are named after the file
+    and a hash of its full path, so files with the same name in different folders get their own copies.
+    :param path (str): the path of the Excel file
+    :param cache_dir (str): the folder that stores the Feather copies
+    :return: the same dataframe as pd.read_excel(path)
+    '''
+    if feather is None:
+        return pd.read_excel(path)
 
-    temp_dict = dict(zip(list(gp_df.index), list(gp_df['GP'])))
-    for key in list(temp_dict.keys()):
-        qtr_total_gp_dict[key] = temp_dict[key]
-    qtr_total_gp_list = list(qtr_total_gp_dict.values())
+    name = f"{os.path.basename(path)}-{hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:12]}"
+    cache_path = os.path.join(cache_dir, f"{name}.feather")
+    meta_path = os.path.join(cache_dir, f"{name}.json")
+    stat = os.stat(path)
+    key = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
 
-    # Calculate PPG given the two lists
-    qtr_ppg_list = []
-    for i in range(len(qtr_total_gp_list)):
-        if qtr_total_gp_list[i] != 0:  # avoid dividing by 0 games played
-            qtr_ppg_list.append(qtr_total_pts_list[i] / qtr_total_gp_list[i])
+    meta = _read_cache_meta(meta_path, cache_path)
+    if meta is not None and (meta['mtime_ns'], meta['size']) != (key['mtime_ns'], key['size']):
+        key['sha256'] = _file_sha256(path)
+        if key['sha256'] != meta['sha256']:
+            meta = None  # the spreadsheet changed
         else:
-            qtr_ppg_list.append(0)
+            meta.update(key)  # the file was only touched, so keep the copy and remember the new time
+            _write_json(meta, meta_path)
+
+    if meta is not None:
+        return _read_feather_copy(cache_path, meta)
+
+    df = pd.read_excel(path)
+    columns = _write_feather_copy(df, cache_path)
+    if columns is None:
+        LOGGER.warning(f"Could not cache {path}, it has a column with unsupported types")
+        return df
+    key.setdefault('sha256', _file_sha256(path))
+    _write_json({**key, **columns}, meta_path)
+    LOGGER.info(f"Cached {path} to {cache_path}")
+    return df
+
 
-    LOGGER.info(f"List of points per game for {qtr}: {qtr_ppg_list}")
-    return qtr_ppg_list
+def find_summary_files(year, data_dir="Data"):
+    '''
+    Finds the Excel files that hold the player statistics for a season, however many parts it was downloaded in.
+    :param year (str): a two digit string in the form 'YY' indicating the corresponding NHL season for the stats
+    :param data_dir (str): the folder with the Excel files
+    :return: a list of paths ordered by part number ({year}Summary.xlsx counts as part 0)
+
+    Example:
+    find_summary_files('12') -> ['Data/12Summary1.xlsx', 'Data/12Summary2.xlsx', ..., 'Data/12Summary9.xlsx']
+    '''
+    pattern = re.compile(rf"{year}Summary(\d*)\.xlsx$")
+    parts = []
+    for name in os.listdir(data_dir):
+        match = pattern.match(name)
+        if match:
+            parts.append((int(match.group(1) or 0), os.path.join(data_dir, name)))
+    if not parts:
+        raise FileNotFoundError(f"No summary files for the {year} season in {data_dir}")
+    return [path for _, path in sorted(parts)]
 
 
-def create_summary_df(year):
+def _combine_summary_parts(summaries, year):
     '''
-    Produces a single dataframe from 9 different Excel files that contain player statistics for the same season
+    Combines the parts of a season into one dataframe, keeping the first row of every player.
+    :param summaries (list): the dataframes of every part, in part order
     :param year (str): a two digit string in the form 'YY' indicating the corresponding NHL season for the stats
     :return: a dataframe with all stats in year
     '''
-    summary1 = pd.read_excel(f"Data/{year}Summary1.xlsx")
-    summary2 = pd.read_excel(f"Data/{year}Summary2.xlsx")
-    summary3 = pd.read_excel(f"Data/{year}Summary3.xlsx")
-    summary4 = pd.read_excel(f"Data/{year}Summary4.xlsx")
-    summary5 = pd.read_excel(f"Data/{year}Summary5.xlsx")
-    summary6 = pd.read_excel(f"Data/{year}Summary6.xlsx")
-    summary7 = pd.read_excel(f"Data/{year}Summary7.xlsx")
-    summary8 = pd.read_excel(f"Data/{year}Summary8.xlsx")
-    summary9 = pd.read_excel(f"Data/{year}Summary9.xlsx")
-
-    output_df = pd.concat([summary1, summary2, summary3, summary4, summary5, summary6, summary7, summary8, summary9])
+    output_df = pd.concat(summaries)
     output_df.drop_duplicates(subset='Player', keep='first', inplace=True)
     output_df.reset_index(inplace=True)
     output_df['Year'] = int(f"20{year}")
     return output_df
+
+
+def create_summary_df(year, data_dir="Data"):
+    '''
+    Produces a single dataframe from the Excel files that contain player statistics for the same season
+    :param year (str): a two digit string in the form 'YY' indicating the corresponding NHL season for the stats
+    :param data_dir (str): the folder with the Excel files
+    :return: a dataframe with all stats in year
+    '''
+    return _combine_summary_parts([read_excel_cached(path) for path in find_summary_files(year, data_dir)], year)
+
+
+def _pool_context():
+    '''
+    Picks how worker processes are started. Forking avoids re-running the calling script in every worker. Without it
+    (ie. Windows), the calling script must guard its code with if __name__ == '__main__'.
+    :return: a multiprocessing context
+    '''
+    return multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+
+
+def load_summary_dfs(years, workers=None, data_dir="Data"):
+    '''
+    Produces the same dataframes as create_summary_df for several seasons, reading every part of every season at
+    once on a process pool.
+    :param years (list): two digit strings in the form 'YY' indicating the NHL seasons to load
+    :param workers (int): the number of processes to read with (defaults to the number of CPUs). 1 reads serially
+    :param data_dir (str): the folder with the Excel files
+    :return: a dictionary where the keys are the years and the values are the dataframes with all stats in that year
+
+    Example:
+    load_summary_dfs(['12', '14']) -> {'12': create_summary_df('12'), '14': create_summary_df('14')}
+    '''
+    season_files = {year: find_summary_files(year, data_dir) for year in years}
+    paths = [path for year in years for path in season_files[year]]
+
+    if workers == 1:
+        summaries = [read_excel_cached(path) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as executor:
+            summaries = list(executor.map(read_excel_cached, paths))
+    LOGGER.info(f"Read {len(paths)} files for {len(years)} seasons")
+
+    summary_dfs = {}
+    position = 0
+    for year in years:
+        n_parts = len(season_files[year])
+        summary_dfs[year] = _combine_summary_parts(summaries[position:position + n_parts], year)
+        position += n_parts
+    return summary_dfs
+
+
+class SeasonRegistry:
+    '''
+    Knows which seasons of stats exist and reads a season only the first time a contract needs it. Loaded seasons are
+    kept in a least recently used cache that drops the oldest seasons once it holds more than max_bytes.
+
+    Example:
+    seasons = SeasonRegistry(stats_year_dict={2013: 2012, 2020: 2019})
+    seasons.stats_years(pd.Series([2013, 2016])) -> [2012, 2016]
+    seasons.stats_for([2012, 2016, 2016]) -> the stats of the 2012 and 2016 seasons, the only ones read from disk
+    '''
+
+    def __init__(self, data_dir="Data", stats_year_dict=None, max_bytes=SEASON_CACHE_BYTES, workers=1):
+        '''
+        Finds every season with Excel files in data_dir. No file is read until a season is needed.
+        :param data_dir (str): the folder with the Excel files, named {YY}Summary.xlsx or {YY}Summary{part}.xlsx
+        :param stats_year_dict (dict): maps a signing year to the season its stats come from, for seasons that were
+        cut short (ie. {2013: 2012} for the lockout). Years that are not in it use their own season
+        :param max_bytes (int): the memory the cache may use for loaded seasons
+        :param workers (int): the number of processes that read the Excel files when several seasons are needed at
+        once (defaults to the number of CPUs). 1 reads serially
+        '''
+        self.data_dir = data_dir
+        self.stats_year_dict = dict(stats_year_dict or {})
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self._loaders = {}  # season -> 'YY' for the Excel files in data_dir, or a function that returns the stats
+        self._cache = OrderedDict()  # season -> (dataframe, bytes), the most recently used last
+        self._cache_bytes = 0
+
+        pattern = re.compile(r"(\d{2})Summary\d*\.xlsx$")
+        for name in os.listdir(data_dir):
+            match = pattern.match(name)
+            if match:
+                self._loaders[int(f"20{match.group(1)}")] = match.group(1)
+
+    def register(self, year, loader):
+        '''
+        Adds a season, or replaces how an existing season is read.
+        :param year (int): the season, ie. 2018
+        :param loader (function): takes no arguments and returns the stats of the season as a dataframe
+        :return: None
+        '''
+        self._loaders[year] = loader
+        self._evict(year)
+
+    def years(self):
+        '''
+        Lists the seasons without loading them.
+        :return: a sorted list of every season that can be loaded
+        '''
+        return sorted(self._loaders)
+
+    def stats_years(self, signing_years):
+        '''
+        Finds the season to take stats from for every signing year, remapping the years in stats_year_dict.
+        :param signing_years (pd.Series): the signing year of every contract
+        :return: a series with the stats year of every contract
+        '''
+        return signing_years.map(self.stats_year_dict).fillna(signing_years).astype(signing_years.dtype)
+
+    def load(self, years):
+        '''
+        Returns the stats of several seasons, reading only the ones that are not cached. Seasons in Excel files are
+        read together on a process pool.
+        :param years (list): the seasons to return. Seasons that are not registered are skipped
+        :return: a dictionary where the keys are the seasons (in the order of years) and the values are the dataframes
+        '''
+        years = [year for year in dict.fromkeys(int(year) for year in years) if year in self._loaders]
+        missing = [year for year in years if year not in self._cache]
+        loaded = {}
+
+        excel_years = {self._loaders[year]: year for year in missing if isinstance(self._loaders[year], str)}
+        if excel_years:
+            summary_dfs = load_summary_dfs(list(excel_years), workers=self.workers, data_dir=self.data_dir)
+            loaded.update({excel_years[short_year]: df for short_year, df in summary_dfs.items()})
+        for year in missing:
+            if year not in loaded:
+                loaded[year] = self._loaders[year]()
+        if missing:
+            LOGGER.info(f"Loaded the {', '.join(str(year) for year in missing)} seasons")
+
+        seasons = {}
+        for year in years:
+            if year in loaded:
+                df = loaded[year]
+                self._cache[year] = (df, int(df.memory_usage(deep=True).sum()))
+                self._cache_bytes += self._cache[year][1]
+            else:
+                df = self._cache[year][0]
+            self._cache.move_to_end(year)
+            seasons[year] = df
+        while self._cache_bytes > self.max_bytes and len(self._cache) > 1:
+            self._evict(next(iter(self._cache)))
+        return seasons
+
+    def get(self, year):
+        '''
+        Returns the stats of one season, reading it if it is not cached.
+        :param year (int): the season, ie. 2012
+        :return: a dataframe with the stats of the season
+        '''
+        if year not in self._loaders:
+            raise KeyError(f"No stats for the {year} season")
+        return self.load([year])[year]
+
+    def stats_for(self, stats_years):
+        '''
+        Loads every season that the contracts need and nothing else.
+        :param stats_years (list): the stats year of every contract, repeats are fine
+        :return: a dataframe with the stats of every needed season, stacked from the oldest season to the newest
+        '''
+        seasons = self.load(sorted(set(int(year) for year in pd.Series(stats_years).dropna())))
+        return pd.concat(list(seasons.values()))
+
+    def _evict(self, year):
+        '''
+        Drops a season from the cache, if it is there.
+        :param year (int): the season
+        :return: None
+        '''
+        if year in self._cache:
+            self._cache_bytes -= self._cache.pop(year)[1]
+
+
+def build_season_index(season_dfs):
+    '''
+    Stacks the stats of several seasons into one dataframe indexed by (Stats Year, Player). It is built once, so finding
+    a player in a season is a hash lookup instead of a scan of that season.
+    :param season_dfs (dict): the keys are the stats years and the values are dataframes with a Player column
+    :return: a dataframe indexed by (Stats Year, Player) with every column of season_dfs, keeping the first row of a
+    player that appears more than once in a season
+
+    Example:
+    build_season_index({2012: stats_12_df, 2014: stats_14_df}).loc[(2014, 'Sidney Crosby'), 'P'] -> 104
+    '''
+    index_df = pd.concat(season_dfs, names=['Stats Year', None]).reset_index(level=1, drop=True)
+    index_df.set_index('Player', drop=False, append=True, inplace=True)
+    return index_df[~index_df.index.duplicated(keep='first')]
+
+
+def lookup_season_rows(season_index, stats_years, players):
+    '''
+    Finds every (stats year, player) pair in the output of build_season_index in linear time.
+    :param season_index (pd.Dataframe): the output of build_season_index
+    :param stats_years (list): the season to look in for every player, NaN or None to not look at all
+    :param players (list): the players to find
+    :return: an array with the row of every pair in season_index, -1 where the pair is missing
+
+    Example:
+    lookup_season_rows(season_index, [2014, 2014], ['Sidney Crosby', 'Nobody']) -> array([12, -1])
+    '''
+    return season_index.index.get_indexer(pd.MultiIndex.from_arrays([stats_years, players]))
+
+
+def skip_after_misses(missed):
+    '''
+    Finds the contracts that the loop of the old salary_prediction.py skipped. It skipped the contract after every
+    player it could not find, so in a run of misses every second one is skipped, and so is the contract after a run of
+    odd length.
+    :param missed (list): True for every contract that was looked for in a season and not found
+    :return: a boolean array, True for every contract the old loop skipped
+
+    Example:
+    skip_after_misses([True, False, True, True, True, False]) -> array([False, True, False, True, False, True])
+    '''
+    missed = pd.Series(np.asarray(missed, dtype=bool))
+    run_position = missed.groupby((missed != missed.shift()).cumsum()).cumcount().to_numpy()
+    return np.where(missed, run_position % 2 == 1, np.r_[False, (missed & (run_position % 2 == 0)).to_numpy()[:-1]])
+
+
+def _text_codes(values):
+    '''
+    Lays strings out as a matrix of Unicode code points, so they can be parsed with array operations instead of one
+    string at a time.
+    :param values (pd.Series): the strings
+    :return: an array with one row per string, padded with 0 to the length of the longest string
+    '''
+    if values.isna().any():
+        raise ValueError(f"Cannot parse the missing values in {values.name}")
+    text = np.asarray(values, dtype=str)
+    return text.view(np.uint32).reshape(len(text), text.dtype.itemsize // 4)
+
+
+def _parse_digits(codes, start=None, stop=None):
+    '''
+    Reads the digits of every row of a code point matrix as one integer, skipping any other character (ie. '$' or ',').
+    :param codes (np.ndarray): the output of _text_codes
+    :param start (np.ndarray): the first column to read in every row (defaults to the first column)
+    :param stop (np.ndarray): the column after the last one to read in every row (defaults to the end of the row)
+    :return: an int64 array
+
+    Example:
+    _parse_digits(_text_codes(pd.Series(["$1,234,567"]))) -> array([1234567])
+    '''
+    columns = np.arange(codes.shape[1])
+    digits = codes.astype(np.int64) - ord('0')
+    use = (digits >= 0) & (digits <= 9)
+    if start is not None:
+        use &= columns >= start[:, None]
+    if stop is not None:
+        use &= columns < stop[:, None]
+
+    value = np.zeros(len(codes), dtype=np.int64)
+    for column in columns:
+        value = np.where(use[:, column], value * 10 + digits[:, column], value)
+    return value
+
+
+def _find_character(codes, character, last=False):
+    '''
+    Finds the first (or last) column of every row of a code point matrix that holds a character.
+    :param codes (np.ndarray): the output of _text_codes
+    :param character (str): the character to find
+    :param last (bool): find the last occurrence instead of the first
+    :return: an int64 array with a column per row
+    '''
+    matches = codes == ord(character)
+    if not matches.any(axis=1).all():
+        raise ValueError(f"Every value needs a '{character}'")
+    if last:
+        return codes.shape[1] - 1 - np.argmax(matches[:, ::-1], axis=1)
+    return np.argmax(matches, axis=1)
+
+
+def parse_contract_columns(salaries_df):
+    '''
+    Splits the Player column of the spotrac contracts into the player's name, signing year and contract length with
+    array operations.
+    :param salaries_df (pd.Dataframe): contracts with the Player column in the form
+    "FIRSTNAME LASTNAME POSITION | SIGNINGYEAR-YYYY (FA: YYYY)"
+    :return: a copy of salaries_df where Player only holds "FIRSTNAME LASTNAME", and 'Signing Year' and 'Contract Years'
+    (YYYY - SIGNINGYEAR) are int16 columns
+
+    Example:
+    parse_contract_columns(salaries_df) -> Player: "Oliver Ekman-Larsson" (from "Oliver Ekman-Larsson D | 2019-2027
+    (FA: 2027)"), Signing Year: 2019, Contract Years: 8
+    '''
+    output_df = salaries_df.copy()
+    codes = _text_codes(output_df['Player'])
+    columns = np.arange(codes.shape[1])
+
+    # The signing year is the last 4 characters before the last dash and the contract ends with the 4 characters after
+    # it. Names can have dashes too (ie. Ekman-Larsson)
+    last_dash = _find_character(codes, '-', last=True)[:, None]
+    signing_year, end_year = [
+        _parse_digits(np.where((year_columns >= 0) & (year_columns < codes.shape[1]),
+                               np.take_along_axis(codes, year_columns.clip(0, codes.shape[1] - 1), axis=1), 0))
+        for year_columns in [last_dash + np.arange(-4, 0), last_dash + np.arange(1, 5)]]
+    output_df['Signing Year'] = signing_year.astype(np.int16)
+    output_df['Contract Years'] = (end_year - signing_year).astype(np.int16)
+
+    # The name is everything before the second space
+    spaces = codes == ord(' ')
+    second_space = np.argmax(spaces & (columns > _find_character(codes, ' ')[:, None]), axis=1)
+    name_codes = np.where(columns < second_space[:, None], codes, 0)
+    names = name_codes.astype(np.uint32).view(f'U{codes.shape[1]}').ravel()
+    output_df['Player'] = pd.Series(names, index=output_df.index, dtype=output_df['Player'].dtype)
+    return output_df
+
+
+def clean_stats_columns(reg_data_df):
+    '''
+    Converts the text columns of the merged contracts and stats to compact numbers with array operations.
+    :param reg_data_df (pd.Dataframe): contracts merged with stats, with AAV as "$1,234,567", TOI/GP as "MM:SS", '--'
+    for a missing S% or FOW% and Signed Age
+    :return: a copy of reg_data_df where AAV is in millions of dollars, TOI/GP is in minutes, S% and FOW% are 0 where
+    they were missing (all float32) and Signed Age is int16
+
+    Example:
+    clean_stats_columns(reg_data_df) -> AAV: 1.234567, TOI/GP: 17.5 (from "17:30"), S%: 0.0 (from '--')
+    '''
+    output_df = reg_data_df.copy()
+    output_df['AAV'] = (_parse_digits(_text_codes(output_df['AAV'])) / 1000000).astype(np.float32)
+    for column in MINUTES_COLUMNS:
+        output_df[column] = _minutes_column(output_df[column])
+    for column in MISSING_AS_ZERO_COLUMNS:
+        output_df[column] = _missing_as_zero_column(output_df[column])
+    output_df['Signed Age'] = output_df['Signed Age'].astype(np.int16)
+    return output_df
+
+
+def _minutes_column(column):
+    '''
+    Converts a column of "MM:SS" times to minutes. Columns that are already numbers are only cast.
+    :param column (pd.Series): the times
+    :return: the minutes as a float32 array
+    '''
+    if pd.api.types.is_numeric_dtype(column):
+        return column.to_numpy(dtype=np.float32)
+    codes = _text_codes(column)
+    colon = _find_character(codes, ':')
+    minutes = _parse_digits(codes, stop=colon)
+    seconds = _parse_digits(codes, start=colon + 1)
+    return (minutes + seconds / 60).astype(np.float32)
+
+
+def _missing_as_zero_column(column):
+    '''
+    Converts a column of numbers with '--' where NHL.com has no value (ie. FOW% of a defenseman) to numbers with 0.
+    :param column (pd.Series): the numbers
+    :return: the numbers as a float32 array
+    '''
+    if pd.api.types.is_numeric_dtype(column):
+        return column.to_numpy(dtype=np.float32)
+    return pd.to_numeric(column.mask(column.eq('--'), 0)).to_numpy(dtype=np.float32)
+
+
+def _ols_lstsq(variables, salaries):
+    '''
+    Fits OLS with NumPy's SVD least squares, which gives the same minimum norm coefficients as the pseudo-inverse that
+    statsmodels uses when features are collinear.
+    :param variables (np.ndarray): the features
+    :param salaries (np.ndarray): the targets
+    :return: the coefficients
+    '''
+    return np.linalg.lstsq(variables, salaries, rcond=None)[0]
+
+
+def _ols_cholesky(variables, salaries, tol=1e-10):
+    '''
+    Fits OLS by solving the normal equations X'X b = X'y with a Cholesky factorization of the Gram matrix of the scaled
+    features. The LAPACK routines are called directly, as the wrappers around them cost more than the solve for the
+    handful of features in a model. Subsets with collinear features (ie. G, A and P) fall back to _ols_lstsq, using the
+    same tolerance as the sweeps in subset_regression_mae.
+    :param variables (np.ndarray): the features
+    :param salaries (np.ndarray): the targets
+    :param tol (float): the smallest remaining variance of a scaled feature before it counts as collinear
+    :return: the coefficients
+    '''
+    if variables.shape[1] == 0:
+        return np.zeros(0)
+    gram = variables.T @ variables
+    scale = np.sqrt(np.diagonal(gram))
+    scale[scale == 0] = 1
+    factor, info = linalg.lapack.dpotrf(gram / np.outer(scale, scale), lower=1)  # the features scaled to length 1
+    if info != 0 or np.diagonal(factor).min() ** 2 <= tol:  # the squared diagonal is each feature's remaining variance
+        return _ols_lstsq(variables, salaries)
+    coefficients, info = linalg.lapack.dpotrs(factor, variables.T @ salaries / scale, lower=1)
+    return coefficients / scale
+
+
+def _ols_statsmodels(variables, salaries):
+    '''
+    Fits OLS with statsmodels, which also builds the covariance matrix and the rest of the results object.
+    :param variables (np.ndarray): the features
+    :param salaries (np.ndarray): the targets
+    :return: the coefficients
+    '''
+    import statsmodels.api as sm  # only loaded when this backend is used
+    return sm.OLS(salaries, variables).fit().params
+
+
+# The ways fit_ols can fit a model. Any function that takes the features and targets and returns the coefficients can
+# be added
+OLS_BACKENDS = {'cholesky': _ols_cholesky, 'lstsq': _ols_lstsq, 'statsmodels': _ols_statsmodels}
+
+
+def fit_ols(variables, salaries, backend='cholesky'):
+    '''
+    Fits an OLS model without a constant and returns only its coefficients, for loops that fit many models and only
+    need their predictions. statsmodels is best kept for the models whose summary gets printed.
+    :param variables (np.ndarray): the features, one column per feature
+    :param salaries (np.ndarray): the targets
+    :param backend (str or function): a name in OLS_BACKENDS, or a function of (features, targets) that returns the
+    coefficients
+    :return: the coefficients, in the order of the columns
+
+    Example:
+    sal_pred = var_test @ fit_ols(var_train, sal_train) -> the same predictions as sm.OLS(sal_train, var_train).fit()
+    '''
+    if not callable(backend):
+        if backend not in OLS_BACKENDS:
+            raise ValueError(f"Unknown OLS backend {backend}, use one of {list(OLS_BACKENDS)}")
+        backend = OLS_BACKENDS[backend]
+    return np.asarray(backend(np.asarray(variables, dtype=float), np.asarray(salaries, dtype=float)))
+
+
+def _group_codes(data_df, columns):
+    '''
+    Numbers the groups of a grouping.
+    :param data_df (pd.Dataframe): the rows to group
+    :param columns (str, list or None): the column(s) to group by, or None to put every row in one group
+    :return: the group number of every row (-1 where a grouping column is missing) and the group keys, in order
+    '''
+    if columns is None:
+        return np.zeros(len(data_df), dtype=np.intp), ['All']
+    grouped = data_df.groupby(columns, sort=True)
+    return grouped.ngroup().fillna(-1).to_numpy(dtype=np.intp), list(grouped.size().index)
+
+
+def fit_ols_groups(data_df, features, targets, groupings, min_rows=None, tol=1e-10):
+    '''
+    Fits the same OLS model (without a constant, like the models in salary_prediction.py) for every target and every
+    group of every grouping in one pass. The Gram matrices of all the groups are summed in one go and stacked, so a
+    single batched eigendecomposition solves every group and target at once instead of one statsmodels fit per model.
+    Collinear features get the minimum norm coefficients of the scaled features, the predictions are the same as
+    statsmodels but the coefficients of the collinear features can be split between them differently.
+    :param data_df (pd.Dataframe): one row per player with the features, targets and grouping columns
+    :param features (list): the feature columns
+    :param targets (list): the target columns, ie. ['AAV', 'Cap Hit %']
+    :param groupings (dict): the name of each grouping mapped to the column(s) to group by, or None for all the rows
+    :param min_rows (int): groups with fewer rows are skipped, by default one more than the number of features
+    :param tol (float): eigenvalues of a group's scaled Gram matrix below tol times the largest count as collinear
+    :return: a tidy dataframe with one row per grouping, group, target and feature, and the columns 'Coefficient',
+    'Std Error', and the model's 'Rows', (uncentered) 'R2' and in-sample 'MAE'
+
+    Example:
+    fit_ols_groups(reg_data_df, ['G', 'A'], ['AAV'], {'Stats Year': 'Stats Year', 'Position': 'Pos'}) ->
+    Grouping    Group   Target  Feature Coefficient Std Error   Rows    R2      MAE
+    Stats Year  2012    AAV     G       0.061       0.012       44      0.88    0.96
+    ...
+    Position    D       AAV     A       0.071       0.004       203     0.86    0.90
+    '''
+    features, targets = list(features), list(targets)
+    complete_df = data_df.dropna(subset=features + targets)
+    if len(complete_df) < len(data_df):
+        LOGGER.warning(f"Skipped {len(data_df) - len(complete_df)} rows with missing features or targets")
+    variables = complete_df[features].to_numpy(dtype=float)
+    target_values = complete_df[targets].to_numpy(dtype=float)
+    min_rows = len(features) + 1 if min_rows is None else min_rows
+
+    # Pair every row with its group in each grouping, numbering the groups of all the groupings one after the other
+    pair_groups, pair_rows, group_names, group_keys = [], [], [], []
+    for name, columns in groupings.items():
+        codes, keys = _group_codes(complete_df, columns)
+        counts = np.bincount(codes[codes >= 0], minlength=len(keys))
+        small = [key for key, count in zip(keys, counts) if count < min_rows]
+        if small:
+            LOGGER.info(f"Skipped the {name} groups {small} with fewer than {min_rows} rows")
+        kept = np.flatnonzero(counts >= min_rows)
+        numbers = np.full(len(keys) + 1, -1)  # the last entry maps the rows without a group (-1)
+        numbers[kept] = len(group_keys) + np.arange(len(kept))
+        rows = np.flatnonzero(numbers[codes] >= 0)
+        pair_groups.append(numbers[codes[rows]])
+        pair_rows.append(rows)
+        group_names += [name] * len(kept)
+        group_keys += [keys[index] for index in kept]
+    if not group_keys:
+        raise ValueError(f"No group has at least {min_rows} rows")
+    order = np.argsort(np.concatenate(pair_groups), kind='stable')
+    pair_groups, pair_rows = np.concatenate(pair_groups)[order], np.concatenate(pair_rows)[order]
+    starts = np.flatnonzero(np.r_[True, pair_groups[1:] != pair_groups[:-1]])
+    counts = np.diff(np.r_[starts, len(pair_groups)])
+
+    # X'X and X'Y of every group, stacked on the first axis
+    pair_variables, pair_targets = variables[pair_rows], target_values[pair_rows]
+    grams = np.add.reduceat(pair_variables[:, :, None] * pair_variables[:, None, :], starts)
+    moments = np.add.reduceat(pair_variables[:, :, None] * pair_targets[:, None, :], starts)
+
+    # Pseudo-inverse of every scaled Gram matrix from one batched eigendecomposition
+    scale = np.sqrt(np.diagonal(grams, axis1=1, axis2=2)).copy()
+    scale[scale == 0] = 1
+    eigenvalues, eigenvectors = np.linalg.eigh(grams / (scale[:, :, None] * scale[:, None, :]))
+    kept = eigenvalues > tol * eigenvalues[:, -1:]
+    inverse_values = np.where(kept, 1 / np.where(kept, eigenvalues, 1), 0)
+    inverse = (eigenvectors * inverse_values[:, None, :]) @ eigenvectors.transpose(0, 2, 1)
+    coefficients = inverse @ (moments / scale[:, :, None]) / scale[:, :, None]  # groups x features x targets
+
+    residuals = pair_targets - np.einsum('ij,ijk->ik', pair_variables, coefficients[pair_groups])
+    rss = np.add.reduceat(residuals ** 2, starts)
+    mae = np.add.reduceat(np.abs(residuals), starts) / counts[:, None]
+    r2 = 1 - rss / np.add.reduceat(pair_targets ** 2, starts)
+    dof = counts - kept.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = np.where(dof[:, None] > 0, rss / dof[:, None], np.nan)
+    std_errors = np.sqrt(np.diagonal(inverse, axis1=1, axis2=2)[:, :, None] * variance[:, None, :]) / scale[:, :, None]
+
+    # One row per group, target and feature
+    group, target, feature = np.meshgrid(np.arange(len(group_keys)), np.arange(len(targets)),
+                                         np.arange(len(features)), indexing='ij')
+    group, target, feature = group.ravel(), target.ravel(), feature.ravel()
+    keys = np.empty(len(group_keys), dtype=object)  # filled one by one to keep the tuple keys of multi-column groupings
+    for index, key in enumerate(group_keys):
+        keys[index] = key
+    return pd.DataFrame({'Grouping': np.array(group_names, dtype=object)[group], 'Group': keys[group],
+                         'Target': np.array(targets, dtype=object)[target],
+                         'Feature': np.array(features, dtype=object)[feature],
+                         'Coefficient': coefficients[group, feature, target],
+                         'Std Error': std_errors[group, feature, target], 'Rows': counts[group],
+                         'R2': r2[group, target], 'MAE': mae[group, target]})
+
+
+def _training_data_hash(variables, salaries):
+    '''
+    Hashes the training data of a model, so a saved model can be traced back to the data it was fitted on.
+    :param variables (np.ndarray): the training features
+    :param salaries (np.ndarray): the training targets
+    :return: the SHA-256 hex digest of the values as float64
+    '''
+    digest = hashlib.sha256()
+    for values in [variables, salaries]:
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        digest.update(str(values.shape).encode())
+        digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+def save_salary_model(features, coefficients, var_train, sal_train, path=SALARY_MODEL_PATH, **metrics):
+    '''
+    Saves a fitted salary model as JSON for predict_salary: the coefficients in the order of the features, how the
+    stats columns were cleaned and a hash of the training data. The file is written next to its final path first and
+    then moved into place, so predict_salary never reads half of a model.
+    :param features (list): the feature names, in the order of the coefficients
+    :param coefficients (list or np.ndarray): the coefficients of a model without a constant, ie. result.params
+    :param var_train (np.ndarray): the features the model was fitted on
+    :param sal_train (np.ndarray): the salaries (AAV in millions) the model was fitted on
+    :param path (str): the JSON file to write
+    :param metrics (float): anything else to keep with the model, ie. mae=0.88
+    :return: the saved model as a dictionary
+
+    Example:
+    save_salary_model(best_features, result.params, var_train, sal_train, mae=0.88) -> {'features': ['G', 'A', ...],
+    'coefficients': [0.06, 0.04, ...], 'training': {'rows': 426, 'sha256': '3f1c...', ...}, ...}
+    '''
+    features, coefficients = list(features), np.asarray(coefficients, dtype=float).ravel()
+    if len(features) != len(coefficients):
+        raise ValueError(f"Got {len(coefficients)} coefficients for {len(features)} features")
+    model = {'format': SALARY_MODEL_FORMAT, 'target': 'AAV', 'units': 'millions of dollars', 'constant': False,
+             'features': features, 'coefficients': coefficients.tolist(),
+             'cleaning': {'minutes': [column for column in MINUTES_COLUMNS if column in features],
+                          'missing_as_zero': [column for column in MISSING_AS_ZERO_COLUMNS if column in features]},
+             'training': {'rows': len(sal_train), 'sha256': _training_data_hash(var_train, sal_train),
+                          'saved': datetime.now().isoformat(timespec='seconds'),
+                          **{name: float(value) for name, value in metrics.items()}}}
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.tmp', 'w') as file:
+        json.dump(model, file, indent=2)
+    os.replace(path + '.tmp', path)
+    return model
+
+
+@functools.lru_cache(maxsize=8)
+def _read_salary_model(path, modified):
+    '''
+    Reads a model saved by save_salary_model. Cached by the file's modified time, so a model is only read again after
+    it is saved again.
+    :param path (str): the JSON file
+    :param modified (int): the file's modified time in nanoseconds
+    :return: the model as a dictionary, with the coefficients as an array
+    '''
+    with open(path) as file:
+        model = json.load(file)
+    if model.get('format') != SALARY_MODEL_FORMAT:
+        raise ValueError(f"{path} has salary model format {model.get('format')}, expected {SALARY_MODEL_FORMAT}")
+    model['coefficients'] = np.asarray(model['coefficients'], dtype=float)
+    model['coefficients'].flags.writeable = False  # shared between the callers of the cache
+    return model
+
+
+def load_salary_model(path=SALARY_MODEL_PATH):
+    '''
+    Loads a model saved by save_salary_model.
+    :param path (str): the JSON file
+    :return: the model as a dictionary, with the coefficients as an array
+    '''
+    return _read_salary_model(path, os.stat(path).st_mtime_ns)
+
+
+def predict_salary(player_stats_df, model=SALARY_MODEL_PATH):
+    '''
+    Predicts the AAV of every player with a saved model, in one matrix product and without statsmodels or sklearn. The
+    stats can be cleaned already or come straight from the NHL.com summary sheets ("MM:SS" TOI/GP and '--' for a missing
+    S% or FOW%), they are cleaned the same way as in clean_stats_columns.
+    :param player_stats_df (pd.Dataframe): one row per player with (at least) the model's features
+    :param model (str or dict): the path of a model saved by save_salary_model, or a model from load_salary_model
+    :return: a series with the predicted AAV in millions of dollars, with the index of player_stats_df
+
+    Example:
+    predict_salary(stats_df) -> 0: 4.21, 1: 0.93, ... (Name: Predicted AAV)
+    '''
+    if not isinstance(model, dict):
+        model = load_salary_model(model)
+    missing = [feature for feature in model['features'] if feature not in player_stats_df.columns]
+    if missing:
+        raise KeyError(f"The stats are missing the model features {missing}")
+
+    variables = np.empty((len(player_stats_df), len(model['features'])))
+    for position, feature in enumerate(model['features']):
+        column = player_stats_df[feature]
+        if feature in model['cleaning']['minutes']:
+            variables[:, position] = _minutes_column(column)
+        elif feature in model['cleaning']['missing_as_zero']:
+            variables[:, position] = _missing_as_zero_column(column)
+        else:
+            variables[:, position] = column.to_numpy(dtype=float)
+    return pd.Series(variables @ model['coefficients'], index=player_stats_df.index, name='Predicted AAV')
+
+
+def _sweep(gram, k):
+    '''
+    Sweeps the augmented Gram matrix on pivot k in place. Sweeping the same pivot twice restores the matrix, so the
+    same call adds a feature to the model or removes it.
+    :param gram (np.ndarray): the augmented matrix [[X'X, X'y], [y'X, y'y]]
+    :param k (int): the index of the feature to sweep
+    :return: None
+    '''
+    pivot = gram[k, k]
+    col = gram[:, k].copy()
+    row = gram[k, :].copy()
+    gram -= np.outer(col, row) / pivot
+    gram[k, :] = row / pivot
+    gram[:, k] = -col / pivot
+    gram[k, k] = 1 / pivot
+
+
+def _subset_mae_range(base_gram, scaled_test, sal_test, feature_names, start, stop, top_k=None, tol=1e-10):
+    '''
+    Calculates the MAE of every subset whose Gray code index lies in [start, stop).
+    :param base_gram (np.ndarray): the augmented Gram matrix of the scaled training data
+    :param scaled_test (np.ndarray): the test features divided by the training column scales
+    :param sal_test (np.ndarray): the test targets
+    :param feature_names (list): the feature names, in the same order as the columns
+    :param start (int): the first Gray code index (must be at least 1, index 0 is the empty subset)
+    :param stop (int): one past the last Gray code index
+    :param top_k (int): if given, only keep the top_k subsets with the smallest MAE in a bounded heap
+    :param tol (float): features whose remaining variance is below this are treated as collinear and get no coefficient
+    :return: a dictionary where the keys are the feature subsets and the values are the MAE, or with top_k, a list of
+    (MAE, Gray code index, subset) sorted from best to worst
+    '''
+    n_features = len(feature_names)
+    gram = base_gram.copy()
+    active = set()
+    swept = []
+    feature_mae_dict = {}
+    heap = []  # (-MAE, -index, subset) so the worst kept subset is at heap[0]
+
+    def refresh():
+        # Rebuild the swept matrix from scratch to stop rounding errors from piling up
+        gram[:] = base_gram
+        swept.clear()
+        for j in sorted(active):
+            if gram[j, j] > tol:
+                _sweep(gram, j)
+                swept.append(j)
+
+    # Start from the subset at index start - 1, which is the empty subset when start = 1
+    code = (start - 1) ^ ((start - 1) >> 1)
+    active.update(j for j in range(n_features) if code >> j & 1)
+    refresh()
+
+    for i in range(start, stop):
+        k = (i & -i).bit_length() - 1  # the Gray code flips the lowest set bit of i
+        if k in active:
+            active.remove(k)
+            if k in swept:
+                _sweep(gram, k)
+                swept.remove(k)
+                # A feature that was collinear with k may now carry information of its own
+                for j in sorted(active.difference(swept)):
+                    if gram[j, j] > tol:
+                        _sweep(gram, j)
+                        swept.append(j)
+        else:
+            active.add(k)
+            if gram[k, k] > tol:
+                _sweep(gram, k)
+                swept.append(k)
+
+        if i % REFRESH_INTERVAL == 0:
+            refresh()
+
+        sal_pred = scaled_test[:, swept] @ gram[swept, n_features]
+        mae = np.mean(np.abs(sal_test - sal_pred))
+        if top_k is None:
+            feature_mae_dict[tuple(feature_names[j] for j in sorted(active))] = mae
+        elif len(heap) < top_k or (-mae, -i) > heap[0][:2]:
+            # Ties go to the subset visited first, the same as min() over the full dictionary
+            item = (-mae, -i, tuple(feature_names[j] for j in sorted(active)))
+            if len(heap) < top_k:
+                heapq.heappush(heap, item)
+            else:
+                heapq.heapreplace(heap, item)
+
+    if top_k is None:
+        return feature_mae_dict
+    return sorted((-neg_mae, -neg_i, subset) for neg_mae, neg_i, subset in heap)
+
+
+def _scaled_gram(var_train, sal_train):
+    '''
+    Builds the augmented Gram matrix of the training data after scaling every feature to unit length.
+    :param var_train (np.ndarray): the training features
+    :param sal_train (np.ndarray): the training targets
+    :return: the augmented Gram matrix and the column scales
+    '''
+    var_train = np.asarray(var_train, dtype=float)
+    sal_train = np.asarray(sal_train, dtype=float)
+    scale = np.sqrt((var_train ** 2).sum(axis=0))
+    scale[scale == 0] = 1  # a column of zeros stays zero and is treated as collinear
+    augmented = np.column_stack([var_train / scale, sal_train])
+    return augmented.T @ augmented, scale
+
+
+def _attach_shared_arrays(specs, feature_names):
+    '''
+    Runs once in every worker process to attach to the arrays the parent process placed in shared memory.
+    :param specs (dict): maps an array name to its shared memory name, shape and dtype
+    :param feature_names (list): the feature names
+    :return: None
+    '''
+    for key, (shm_name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _shared_arrays[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        _shared_arrays[f"{key}_shm"] = shm  # keep the block open while the worker is alive
+    _shared_arrays['feature_names'] = feature_names
+
+
+def _subset_mae_chunk(start, stop, top_k):
+    '''
+    Worker task that calculates the MAE for the Gray code indices [start, stop) from the shared arrays.
+    :param start (int): the first Gray code index
+    :param stop (int): one past the last Gray code index
+    :param top_k (int): if given, only return the top_k subsets of the chunk
+    :return: the output of _subset_mae_range for the chunk
+    '''
+    return _subset_mae_range(_shared_arrays['gram'], _shared_arrays['scaled_test'], _shared_arrays['sal_test'],
+                             _shared_arrays['feature_names'], start, stop, top_k)
+
+
+def _split_subset_range(n_subsets, n_chunks):
+    '''
+    Splits the Gray code indices 1 to n_subsets into contiguous chunks that start on a refresh boundary.
+    :param n_subsets (int): the number of non-empty subsets
+    :param n_chunks (int): the desired number of chunks
+    :return: a list of [start, stop) pairs
+    '''
+    blocks = -(-(n_subsets + 1) // REFRESH_INTERVAL)  # ceiling division
+    step = max(1, -(-blocks // n_chunks)) * REFRESH_INTERVAL
+    bounds = [1] + list(range(step, n_subsets + 1, step)) + [n_subsets + 1]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _parallel_subset_mae(arrays, feature_names, workers, top_k=None, task=None):
+    '''
+    Calculates the MAE of every subset on a process pool. The arrays are copied into shared memory once and every
+    worker attaches to them when it starts, so only the chunk bounds and the results are pickled.
+    :param arrays (dict): the arrays that task reads from _shared_arrays, by name
+    :param feature_names (list): the feature names
+    :param workers (int): the number of worker processes
+    :param top_k (int): if given, only keep the top_k subsets with the smallest MAE
+    :param task (function): the worker task for a chunk of Gray code indices. Defaults to _subset_mae_chunk
+    :return: the output of the task's range function for the whole range of subsets
+    '''
+    task = task or _subset_mae_chunk
+    specs = {}
+    blocks = []
+    try:
+        for key, array in arrays.items():
+            shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            blocks.append(shm)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+            specs[key] = (shm.name, array.shape, array.dtype.str)
+
+        chunks = _split_subset_range(2 ** len(feature_names) - 1, workers * 4)
+        starts, stops = zip(*chunks)
+        feature_mae_dict = {}
+        ranked = []
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context(), initializer=_attach_shared_arrays,
+                                 initargs=(specs, feature_names)) as executor:
+            # map returns the chunks in order, so the dictionary is built in the same order as a serial run
+            for chunk_result in executor.map(task, starts, stops, [top_k] * len(chunks)):
+                if top_k is None:
+                    feature_mae_dict.update(chunk_result)
+                else:
+                    ranked = heapq.nsmallest(top_k, ranked + chunk_result)
+        return feature_mae_dict if top_k is None else ranked
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+
+def subset_regression_mae(var_train, var_test, sal_train, sal_test, feature_names, workers=1, top_k=None):
+    '''
+    Calculates the test MAE of an OLS model (without a constant) for every non-empty subset of features.
+
+    X'X and X'y are computed once and the subsets are visited in Gray code order, so each model is one sweep of the
+    Gram matrix away from the previous one instead of a new statsmodels fit. Subsets with collinear features (ie. G, A
+    and P) give the same predictions as the pseudo-inverse that statsmodels uses.
+    :param var_train (np.ndarray): the training features, with one column for each name in feature_names
+    :param var_test (np.ndarray): the test features
+    :param sal_train (np.ndarray): the training targets
+    :param sal_test (np.ndarray): the test targets
+    :param feature_names (list): the feature names
+    :param workers (int): the number of processes to split the subsets across. The result is identical for any value
+    :param top_k (int): if given, only the top_k subsets with the smallest MAE are kept (in a heap of constant size)
+    :return: a dictionary where the keys are tuples of features (ordered like feature_names) and the values are the MAE.
+    With top_k, the dictionary only has the top_k subsets, ordered from the smallest MAE to the largest
+
+    Example:
+    subset_regression_mae(var_train, var_test, sal_train, sal_test, ['G', 'A']) -> {('G',): 1.2, ('G', 'A'): 1.1, ...}
+    '''
+    gram, scale = _scaled_gram(var_train, sal_train)
+    scaled_test = np.asarray(var_test, dtype=float) / scale
+    sal_test = np.asarray(sal_test, dtype=float)
+    feature_names = list(feature_names)
+    if workers > 1:
+        arrays = {'gram': gram, 'scaled_test': scaled_test, 'sal_test': sal_test}
+        result = _parallel_subset_mae(arrays, feature_names, workers, top_k)
+    else:
+        result = _subset_mae_range(gram, scaled_test, sal_test, feature_names, 1, 2 ** len(feature_names), top_k)
+    if top_k is None:
+        return result
+    return {subset: mae for mae, _, subset in result}
+
+
+def _cv_folds(n_rows, n_splits, n_repeats, seed):
+    '''
+    Splits the rows into folds for repeated k-fold cross-validation. The same arguments always give the same folds, so
+    models scored by subset_cv_mae and elastic_net_cv can be compared fold by fold.
+    :param n_rows (int): the number of rows
+    :param n_splits (int): the number of folds
+    :param n_repeats (int): the number of times the rows are shuffled and split again
+    :param seed (int): seeds the shuffles
+    :return: a list with the test rows of every fold, n_splits * n_repeats arrays
+    '''
+    if not 2 <= n_splits <= n_rows:
+        raise ValueError(f"n_splits must be between 2 and the number of rows ({n_rows}), got {n_splits}")
+    rng = np.random.default_rng(seed)
+    return [fold for _ in range(n_repeats) for fold in np.array_split(rng.permutation(n_rows), n_splits)]
+
+
+def _sweep_folds(grams, k, folds=slice(None)):
+    '''
+    Sweeps a stack of augmented Gram matrices on pivot k in place, the same as _sweep on each matrix.
+    :param grams (np.ndarray): the augmented matrices of every fold, stacked along the first axis
+    :param k (int): the index of the feature to sweep
+    :param folds (slice or np.ndarray): the folds to sweep, all of them by default
+    :return: None
+    '''
+    gram = grams[folds]  # a view for a slice, a copy for an index array
+    pivot = gram[:, k, k, None].copy()
+    col = gram[:, :, k].copy()
+    row = gram[:, k, :] / pivot
+    gram -= col[:, :, None] * row[:, None, :]
+    gram[:, k, :] = row
+    gram[:, :, k] = col / -pivot
+    gram[:, k, k] = 1 / pivot[:, 0]
+    if not isinstance(folds, slice):
+        grams[folds] = gram
+
+
+def _subset_cv_range(base_grams, test_blocks, sal_blocks, fold_sizes, feature_names, start, stop, top_k=None,
+                     tol=1e-10):
+    '''
+    Calculates the MAE on every fold for every subset whose Gray code index lies in [start, stop). This is the walk of
+    _subset_mae_range with the Gram matrices of all the folds swept together, so each subset costs a few operations on
+    a stack of small matrices. A feature is only swept in the folds where it is not collinear with the model.
+    :param base_grams (np.ndarray): the augmented Gram matrix of the scaled training rows of every fold
+    :param test_blocks (np.ndarray): the scaled test rows of every fold, padded with rows of zeros to the same length
+    :param sal_blocks (np.ndarray): the test targets of every fold, padded with zeros
+    :param fold_sizes (np.ndarray): the number of test rows in every fold
+    :param feature_names (list): the feature names, in the same order as the columns
+    :param start (int): the first Gray code index (must be at least 1, index 0 is the empty subset)
+    :param stop (int): one past the last Gray code index
+    :param top_k (int): if given, only keep the top_k subsets with the smallest mean MAE in a bounded heap
+    :param tol (float): features whose remaining variance is below this are treated as collinear and get no coefficient
+    :return: a dictionary where the keys are the feature subsets and the values are the MAE of every fold, or with
+    top_k, a list of (mean MAE, Gray code index, subset, fold MAEs) sorted from best to worst
+    '''
+    n_features = len(feature_names)
+    grams = base_grams.copy()
+    active = set()
+    swept = np.zeros((len(grams), n_features), dtype=bool)  # the features swept in each fold
+    partial = set()  # active features that are collinear with the model in some folds
+    subset_mae_dict = {}
+    heap = []  # (-mean MAE, -index, subset, fold MAEs) so the worst kept subset is at heap[0]
+
+    def sweep_in(k):
+        ready = grams[:, k, k] > tol
+        if k in partial:
+            ready &= ~swept[:, k]
+        if ready.all():
+            _sweep_folds(grams, k)
+            swept[:, k] = True
+            partial.discard(k)
+            return
+        if ready.any():
+            _sweep_folds(grams, k, np.flatnonzero(ready))
+            swept[:, k] |= ready
+        if swept[:, k].all():
+            partial.discard(k)
+        else:
+            partial.add(k)
+
+    def refresh():
+        # Rebuild the swept matrices from scratch to stop rounding errors from piling up
+        grams[:] = base_grams
+        swept[:] = False
+        partial.clear()
+        for j in sorted(active):
+            sweep_in(j)
+
+    # Start from the subset at index start - 1, which is the empty subset when start = 1
+    code = (start - 1) ^ ((start - 1) >> 1)
+    active.update(j for j in range(n_features) if code >> j & 1)
+    refresh()
+
+    for i in range(start, stop):
+        k = (i & -i).bit_length() - 1  # the Gray code flips the lowest set bit of i
+        if k in active:
+            active.remove(k)
+            if k not in partial:
+                _sweep_folds(grams, k)
+            elif swept[:, k].any():
+                _sweep_folds(grams, k, np.flatnonzero(swept[:, k]))
+            swept[:, k] = False
+            partial.discard(k)
+            # A feature that was collinear with k may now carry information of its own
+            for j in sorted(partial):
+                sweep_in(j)
+        else:
+            active.add(k)
+            sweep_in(k)
+
+        if i % REFRESH_INTERVAL == 0:
+            refresh()
+
+        coefficients = np.where(swept, grams[:, :n_features, n_features], 0)
+        sal_pred = np.matmul(test_blocks, coefficients[:, :, None])[:, :, 0]
+        fold_mae = np.abs(sal_blocks - sal_pred).sum(axis=1) / fold_sizes  # the padded rows add no error
+        if top_k is None:
+            subset_mae_dict[tuple(feature_names[j] for j in sorted(active))] = fold_mae
+        else:
+            mae = fold_mae.sum() / len(fold_mae)
+            if len(heap) < top_k or (-mae, -i) > heap[0][:2]:
+                item = (-mae, -i, tuple(feature_names[j] for j in sorted(active)), fold_mae)
+                if len(heap) < top_k:
+                    heapq.heappush(heap, item)
+                else:
+                    heapq.heapreplace(heap, item)
+
+    if top_k is None:
+        return subset_mae_dict
+    return sorted((-neg_mae, -neg_i, subset, fold_mae) for neg_mae, neg_i, subset, fold_mae in heap)
+
+
+def _subset_cv_chunk(start, stop, top_k):
+    '''
+    Worker task that calculates the fold MAEs for the Gray code indices [start, stop) from the shared arrays.
+    :param start (int): the first Gray code index
+    :param stop (int): one past the last Gray code index
+    :param top_k (int): if given, only return the top_k subsets of the chunk
+    :return: the output of _subset_cv_range for the chunk
+    '''
+    return _subset_cv_range(_shared_arrays['grams'], _shared_arrays['test_blocks'], _shared_arrays['sal_blocks'],
+                            _shared_arrays['fold_sizes'], _shared_arrays['feature_names'], start, stop, top_k)
+
+
+def subset_cv_mae(variables, salaries, feature_names, n_splits=10, n_repeats=1, seed=0, workers=1, top_k=None):
+    '''
+    Scores an OLS model (without a constant) for every non-empty subset of features with repeated k-fold
+    cross-validation, so the best subset does not depend on one lucky train/test split.
+
+    The augmented Gram matrix of every fold is computed once, and the training matrix of a fold is the Gram matrix of
+    all the rows minus that fold's. Every subset is then one sweep of all the fold matrices away from the previous one,
+    the same walk as subset_regression_mae, so 10 folds cost about as much as one split.
+    :param variables (np.ndarray): the features, with one column for each name in feature_names
+    :param salaries (np.ndarray): the targets
+    :param feature_names (list): the feature names
+    :param n_splits (int): the number of folds
+    :param n_repeats (int): the number of times the rows are shuffled and split into folds again
+    :param seed (int): seeds the shuffles, so the folds are the same for every call with the same seed
+    :param workers (int): the number of processes to split the subsets across. The result is identical for any value
+    :param top_k (int): if given, only the top_k subsets with the smallest mean MAE are kept, in a heap of constant size
+    :return: a dataframe indexed by the tuples of features (ordered like feature_names) with the columns "Mean MAE" and
+    "Std MAE" over the n_splits * n_repeats folds, smallest mean MAE first
+
+    Example:
+    subset_cv_mae(variables, salaries, ['G', 'A']) -> ('G', 'A'): Mean MAE 1.10, Std MAE 0.12; ('G',): 1.20, 0.15; ...
+    '''
+    variables = np.asarray(variables, dtype=float)
+    salaries = np.asarray(salaries, dtype=float)
+    feature_names = list(feature_names)
+    scale = np.sqrt((variables ** 2).sum(axis=0))
+    scale[scale == 0] = 1  # a column of zeros stays zero and is treated as collinear
+    augmented = np.column_stack([variables / scale, salaries])
+    total_gram = augmented.T @ augmented
+
+    folds = _cv_folds(len(salaries), n_splits, n_repeats, seed)
+    fold_sizes = np.array([len(fold) for fold in folds], dtype=float)
+    grams = np.empty((len(folds),) + total_gram.shape)
+    test_blocks = np.zeros((len(folds), int(fold_sizes.max()), len(feature_names)))
+    sal_blocks = np.zeros((len(folds), int(fold_sizes.max())))
+    for f, fold in enumerate(folds):
+        grams[f] = total_gram - augmented[fold].T @ augmented[fold]
+        test_blocks[f, :len(fold)] = augmented[fold, :-1]
+        sal_blocks[f, :len(fold)] = salaries[fold]
+
+    if workers > 1:
+        arrays = {'grams': grams, 'test_blocks': test_blocks, 'sal_blocks': sal_blocks, 'fold_sizes': fold_sizes}
+        result = _parallel_subset_mae(arrays, feature_names, workers, top_k, task=_subset_cv_chunk)
+    else:
+        result = _subset_cv_range(grams, test_blocks, sal_blocks, fold_sizes, feature_names, 1,
+                                  2 ** len(feature_names), top_k)
+    if top_k is not None:
+        result = {subset: fold_mae for _, _, subset, fold_mae in result}
+
+    fold_mae = np.array(list(result.values())).reshape(len(result), len(folds))
+    cv_df = pd.DataFrame({'Mean MAE': fold_mae.sum(axis=1) / len(folds), 'Std MAE': fold_mae.std(axis=1)},
+                         index=pd.Index(list(result), name='Features', tupleize_cols=False))
+    return cv_df.sort_values('Mean MAE', kind='stable')
+
+
+def _standardize(variables):
+    '''
+    Centers every feature and scales it to unit variance.
+    :param variables (np.ndarray): the features
+    :return: the standardized features, and the means and standard deviations to undo it. Constant features keep a
+    standard deviation of 1 and stay at zero
+    '''
+    means = variables.mean(axis=0)
+    stds = variables.std(axis=0)
+    stds[stds == 0] = 1
+    return (variables - means) / stds, means, stds
+
+
+def _coordinate_descent_path(standardized, centered, alphas, l1_ratio, tol, max_iter):
+    '''
+    Minimizes (1/2n)||y - Xb||^2 + alpha * l1_ratio * ||b||_1 + alpha * (1 - l1_ratio) / 2 * ||b||^2 for every alpha,
+    from the largest to the smallest, with cyclic coordinate descent. Each alpha starts from the coefficients of the
+    previous one, and after every full pass over the features the passes only visit the nonzero coefficients until
+    they settle. The residual is kept up to date, so a pass costs O(n) per feature.
+    :param standardized (np.ndarray): the standardized features
+    :param centered (np.ndarray): the centered targets
+    :param alphas (np.ndarray): the penalties, largest first
+    :param l1_ratio (float): the share of the penalty on the absolute values of the coefficients
+    :param tol (float): a full pass that changes no coefficient by more than tol times the largest coefficient (or the
+    standard deviation of the targets, if that is larger) ends the descent for an alpha
+    :param max_iter (int): the most full passes for an alpha
+    :return: an array with the standardized coefficients for every alpha
+    '''
+    n_rows, n_features = standardized.shape
+    columns = [np.ascontiguousarray(standardized[:, j]) for j in range(n_features)]
+    squares = [column @ column / n_rows for column in columns]  # 1, or 0 for a constant feature
+    coefficients = np.zeros(n_features)
+    residual = centered.copy()
+    path = np.empty((len(alphas), n_features))
+    smallest_scale = centered.std()  # so coefficients that are all but zero do not need to settle to the last digit
+
+    def descend(features, l1, l2):
+        # Returns whether no coefficient moved by more than tol times the largest coefficient
+        largest_change = 0.0
+        largest = smallest_scale
+        for j in features:
+            old = float(coefficients[j])
+            rho = float(columns[j] @ residual) / n_rows + squares[j] * old
+            new = (rho - l1 if rho > l1 else rho + l1 if rho < -l1 else 0.0) / (squares[j] + l2) if squares[j] else 0.0
+            if new != old:
+                residual[:] -= (new - old) * columns[j]
+                coefficients[j] = new
+                largest_change = max(largest_change, abs(new - old))
+            largest = max(largest, abs(new))
+        return largest_change <= tol * largest
+
+    for a, alpha in enumerate(alphas):
+        l1, l2 = alpha * l1_ratio, alpha * (1 - l1_ratio)
+        for _ in range(max_iter):
+            if descend(range(n_features), l1, l2):
+                break
+            active = np.flatnonzero(coefficients).tolist()
+            for _ in range(max_iter):
+                if descend(active, l1, l2):
+                    break
+        path[a] = coefficients
+    return path
+
+
+def elastic_net_path(variables, salaries, feature_names, alphas=None, l1_ratio=1.0, n_alphas=100, eps=1e-3, tol=1e-4,
+                     max_iter=1000):
+    '''
+    Fits the lasso (l1_ratio = 1) or elastic net regularization path with an intercept on standardized features. The
+    cost grows linearly with the number of features, so it works for far more features than a subset search.
+    :param variables (np.ndarray): the features, with one column for each name in feature_names
+    :param salaries (np.ndarray): the targets
+    :param feature_names (list): the feature names
+    :param alphas (np.ndarray): the penalties. Defaults to n_alphas values spaced evenly on a log scale, from the
+    smallest penalty that leaves every coefficient at zero down to eps times that
+    :param l1_ratio (float): the share of the penalty on the absolute values of the coefficients, above 0 and at most 1
+    :param n_alphas (int): the number of default penalties
+    :param eps (float): the smallest default penalty as a share of the largest
+    :param tol (float): the descent for a penalty stops once a pass changes no coefficient by more than tol times the
+    largest one
+    :param max_iter (int): the most full passes over the features for a penalty
+    :return: a dataframe indexed by "Alpha", largest first, with the columns "# Features", "Intercept" and the
+    coefficient of every feature in its original units
+
+    Example:
+    elastic_net_path(variables, salaries, ['G', 'A']) -> Alpha 2.1: # Features 0, Intercept 3.2, G 0.0, A 0.0; ...
+    '''
+    if not 0 < l1_ratio <= 1:
+        raise ValueError(f"l1_ratio must be above 0 and at most 1, got {l1_ratio}")
+    variables = np.asarray(variables, dtype=float)
+    salaries = np.asarray(salaries, dtype=float)
+    standardized, means, stds = _standardize(variables)
+    centered = salaries - salaries.mean()
+    if alphas is None:
+        alpha_max = np.abs(standardized.T @ centered).max() / (len(salaries) * l1_ratio)
+        alphas = np.geomspace(alpha_max, alpha_max * eps, n_alphas)
+    alphas = np.sort(np.asarray(alphas, dtype=float))[::-1]
+
+    coefficients = _coordinate_descent_path(standardized, centered, alphas, l1_ratio, tol, max_iter) / stds
+    path_df = pd.DataFrame(coefficients, index=pd.Index(alphas, name='Alpha'), columns=list(feature_names))
+    path_df.insert(0, 'Intercept', salaries.mean() - coefficients @ means)
+    path_df.insert(0, '# Features', (coefficients != 0).sum(axis=1))
+    return path_df
+
+
+def elastic_net_cv(variables, salaries, feature_names, l1_ratio=1.0, n_alphas=100, eps=1e-3, n_splits=10, n_repeats=1,
+                   seed=0, tol=1e-4, max_iter=1000):
+    '''
+    Fits the lasso or elastic net path on all the rows and scores every point of it with repeated k-fold
+    cross-validation. Every fold fits the whole path on its own training rows, standardized with their own means and
+    standard deviations, with the penalties of the full path. The folds are the ones subset_cv_mae uses for the same
+    n_splits, n_repeats and seed, so the MAEs of the path and of the feature subsets can be compared directly.
+    :param variables (np.ndarray): the features, with one column for each name in feature_names
+    :param salaries (np.ndarray): the targets
+    :param feature_names (list): the feature names
+    :param l1_ratio (float): the share of the penalty on the absolute values of the coefficients, above 0 and at most 1
+    :param n_alphas (int): the number of penalties
+    :param eps (float): the smallest penalty as a share of the largest
+    :param n_splits (int): the number of folds
+    :param n_repeats (int): the number of times the rows are shuffled and split into folds again
+    :param seed (int): seeds the shuffles
+    :param tol (float): the descent for a penalty stops once a pass changes no coefficient by more than tol times the
+    largest one
+    :param max_iter (int): the most full passes over the features for a penalty
+    :return: the output of elastic_net_path with the columns "Mean MAE" and "Std MAE" over the folds in front. The
+    best point is path_df['Mean MAE'].idxmin()
+    '''
+    variables = np.asarray(variables, dtype=float)
+    salaries = np.asarray(salaries, dtype=float)
+    path_df = elastic_net_path(variables, salaries, feature_names, l1_ratio=l1_ratio, n_alphas=n_alphas, eps=eps,
+                               tol=tol, max_iter=max_iter)
+    alphas = path_df.index.to_numpy()
+
+    folds = _cv_folds(len(salaries), n_splits, n_repeats, seed)
+    fold_mae = np.empty((len(folds), len(alphas)))
+    for f, fold in enumerate(folds):
+        train = np.ones(len(salaries), dtype=bool)
+        train[fold] = False
+        standardized, means, stds = _standardize(variables[train])
+        intercept = salaries[train].mean()
+        coefficients = _coordinate_descent_path(standardized, salaries[train] - intercept, alphas, l1_ratio, tol,
+                                                max_iter)
+        sal_pred = intercept + ((variables[fold] - means) / stds) @ coefficients.T
+        fold_mae[f] = np.abs(salaries[fold, None] - sal_pred).mean(axis=0)
+
+    path_df.insert(0, 'Std MAE', fold_mae.std(axis=0))
+    path_df.insert(0, 'Mean MAE', fold_mae.mean(axis=0))
+    return path_df
+
+
+def best_subsets_by_rss(var_train, sal_train, feature_names, n_best=1):
+    '''
+    Finds the n_best subsets of every size with the smallest training residual sum of squares (RSS) using a leaps and
+    bounds style branch and bound search.
+
+    Dropping features can only increase the RSS, so the RSS of a model is a lower bound for every model that can be
+    made by dropping some of its features. A branch is skipped once that bound cannot beat the subsets already kept
+    for any size in the branch. Features that hurt the RSS the most when dropped are branched on first, which makes
+    those branches the ones that get cut.
+    :param var_train (np.ndarray): the training features, with one column for each name in feature_names
+    :param sal_train (np.ndarray): the training targets
+    :param feature_names (list): the feature names
+    :param n_best (int): the number of subsets to keep for each size
+    :return: a dictionary where the keys are tuples of features (ordered like feature_names) and the values are the
+    RSS, ordered by subset size and then RSS
+
+    Example:
+    best_subsets_by_rss(var_train, sal_train, ['G', 'A', 'P']) -> {('P',): 610.2, ('G', 'A'): 590.4, ...}
+    '''
+    gram, _ = _scaled_gram(var_train, sal_train)
+    n_features = len(feature_names)
+    best = {size: [] for size in range(1, n_features + 1)}  # size -> heap of (-RSS, subset)
+
+    def keep(subset, rss):
+        heap = best[len(subset)]
+        if len(heap) < n_best:
+            heapq.heappush(heap, (-rss, subset))
+        elif -rss > heap[0][0]:
+            heapq.heapreplace(heap, (-rss, subset))
+
+    def cannot_improve(rss, smallest, largest):
+        # True if every size the branch can reach already has n_best subsets that are at least as good
+        return all(len(best[size]) == n_best and rss >= -best[size][0][0]
+                   for size in range(max(smallest, 1), largest + 1))
+
+    def sweep_in(matrix, subset, swept):
+        # Sweep every feature of the subset that is not collinear with the features already swept
+        for j in subset:
+            if j not in swept and matrix[j, j] > tol:
+                _sweep(matrix, j)
+                swept.add(j)
+
+    def drop(matrix, swept, subset, f):
+        # Build the swept matrix of the model without feature f
+        child_matrix = matrix.copy()
+        child_swept = set(swept)
+        if f in child_swept:
+            _sweep(child_matrix, f)
+            child_swept.remove(f)
+        sweep_in(child_matrix, [j for j in subset if j != f], child_swept)
+        return child_matrix, child_swept
+
+    def search(matrix, swept, subset, free):
+        # matrix has the current model swept in and free lists the features that may still be dropped from it
+        rss = matrix[n_features, n_features]
+        collinear = [j for j in subset if j not in swept]
+        children = []
+        dropped = {}
+        for f in free:
+            if f not in swept:
+                child_rss = rss  # f is collinear with the swept features, so dropping it changes nothing
+            elif collinear and np.any(np.abs(matrix[f, collinear]) > tol):
+                # A collinear feature depends on f and may take its place, so build the smaller model directly
+                dropped[f] = drop(matrix, swept, subset, f)
+                child_rss = dropped[f][0][n_features, n_features]
+            else:
+                child_rss = rss + matrix[f, n_features] ** 2 / matrix[f, f]
+            children.append((child_rss, f))
+        children.sort(reverse=True)  # the most damaging drops first, they have the smallest subtrees to search
+
+        for position, (child_rss, f) in enumerate(children):
+            child = tuple(j for j in subset if j != f)
+            if child:
+                keep(child, child_rss)
+            child_free = [g for _, g in children[position + 1:]]
+            if child_free and not cannot_improve(child_rss, len(child) - len(child_free), len(child) - 1):
+                child_matrix, child_swept = dropped[f] if f in dropped else drop(matrix, swept, subset, f)
+                search(child_matrix, child_swept, child, child_free)
+
+    tol = 1e-10
+    full = tuple(range(n_features))
+    swept = set()
+    sweep_in(gram, full, swept)
+    keep(full, gram[n_features, n_features])
+    search(gram, swept, full, list(full))
+
+    subset_rss_dict = {}
+    for size in range(1, n_features + 1):
+        for neg_rss, subset in sorted(best[size], reverse=True):
+            subset_rss_dict[tuple(feature_names[j] for j in sorted(subset))] = -neg_rss
+    return subset_rss_dict
+
+
+def _is_hidden(element):
+    '''
+    Checks whether an element of a page is hidden with display:none, which pd.read_html leaves out.
+    '''
+    style = element.get('style')
+    return style is not None and _HIDDEN_STYLE.search(style) is not None
+
+
+def _element_text(element):
+    '''
+    Returns the text inside an element of a page, without the hidden elements, styles and comments, and with a line
+    break for every <br>.
+    '''
+    if not len(element):
+        return element.text or ""
+    pieces = [element.text or ""]
+    for child in element:
+        if child.tag == 'br':
+            pieces.append("\n")
+        elif isinstance(child.tag, str) and child.tag != 'style' and not _is_hidden(child):
+            pieces.append(_element_text(child))
+        pieces.append(child.tail or "")
+    return "".join(pieces)
+
+
+def _table_rows(table, match=None):
+    '''
+    Reads the rows of a <table> element. Every cell is kept as (text, colspan, rowspan), and a row is marked if all its
+    cells are <th> cells.
+    :param table (lxml.etree.Element): the table
+    :param match (str): the cell text that makes the table the wanted one
+    :return: the <thead> rows, the other rows, and whether a cell reads match
+    '''
+    head, body, foot, matched = [], [], [], False
+    for section in table:
+        if section.tag == 'tr':
+            rows, target = [section], body
+        elif section.tag in ('thead', 'tbody', 'tfoot'):
+            rows, target = section, {'thead': head, 'tbody': body, 'tfoot': foot}[section.tag]
+        else:
+            continue
+        for row in rows:
+            if row.tag != 'tr' or _is_hidden(row):
+                continue
+            cells, all_th = [], True
+            for cell in row:
+                if cell.tag not in ('td', 'th') or _is_hidden(cell):
+                    continue
+                text = _HTML_WHITESPACE.sub(" ", _element_text(cell)).strip()
+                cells.append((text, _span(cell.get('colspan')), _span(cell.get('rowspan'))))
+                all_th &= cell.tag == 'th'
+                matched |= text == match
+            if cells:
+                target.append((cells, all_th))
+    return head, body + foot, matched
+
+
+def _span(value):
+    '''
+    Reads a colspan or rowspan attribute, where anything that is not a positive number counts as 1.
+    '''
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def _expand_spans(rows):
+    '''
+    Repeats the text of cells that span several columns or rows, so every row has one value per column.
+    :param rows (list): rows of (text, colspan, rowspan) cells
+    :return: a list of rows of text
+    '''
+    expanded, carried = [], {}  # column -> (text, rows left) of the cells that span into the next rows
+    for cells in rows:
+        row, next_carried, cells = [], {}, iter(cells)
+        cell = next(cells, None)
+        while cell is not None or any(column >= len(row) for column in carried):
+            if len(row) in carried:
+                text, left = carried[len(row)]
+                if left > 1:
+                    next_carried[len(row)] = (text, left - 1)
+                row.append(text)
+            elif cell is not None:
+                text, colspan, rowspan = cell
+                for _ in range(colspan):
+                    if rowspan > 1:
+                        next_carried[len(row)] = (text, rowspan - 1)
+                    row.append(text)
+                cell = next(cells, None)
+            else:
+                row.append("")
+        expanded.append(row)
+        carried = next_carried
+    return expanded
+
+
+def _typed_column(values):
+    '''
+    Converts a column of cell text to numbers when every cell is a number, with ',' as the thousands separator.
+    :param values (list): the text of the cells
+    :return: a numeric pd.Series, or a text pd.Series with missing values for the empty cells
+    '''
+    column = pd.Series([None if value in _MISSING_TEXT else value for value in values])
+    if column.isna().all():
+        return column.astype(float)
+    try:
+        return pd.to_numeric(column.str.replace(",", "", regex=False))
+    except (TypeError, ValueError):
+        return column
+
+
+def read_html_table(html, match=None, header_row=False, converters=None, chunk_size=2 ** 16):
+    '''
+    Reads one table from a page with lxml's incremental parser, instead of building every table on the page like
+    pd.read_html does. The page is fed in chunks, and once the wanted table is closed the rest is never read.
+    The header is the <thead> rows, or else the leading rows made only of <th> cells, like pd.read_html.
+    Columns where every cell is a number become numbers.
+    :param html (bytes, str or iterable): the page, or its chunks as they arrive (ie. response.iter_content())
+    :param match (str): read the first table with a cell that reads match exactly. Defaults to the last table
+    :param header_row (bool): use the first row of the table body as the header, for pages that write their header
+    with <td> cells
+    :param converters (dict): maps column names to functions that convert the text of each cell. Rows where a converter
+    returns None are left out (ie. repeated header rows)
+    :param chunk_size (int): characters fed to the parser at once when html is one piece
+    :return: a dataframe with the table
+    '''
+    if isinstance(html, (bytes, str)):
+        html = [html[start:start + chunk_size] for start in range(0, len(html), chunk_size)]
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    parser = etree.HTMLPullParser(events=('end',), tag='table')
+    found = None
+    for chunk in itertools.chain(html, [None]):
+        if chunk is not None:
+            parser.feed(decoder.decode(chunk) if isinstance(chunk, bytes) else chunk)
+        else:  # the end of the page
+            parser.feed(decoder.decode(b"", final=True))
+            parser.close()
+        for _, table in parser.read_events():
+            if not _is_hidden(table):
+                rows = _table_rows(table, match)
+                if match is None or rows[2]:
+                    found = rows
+        if match is not None and found is not None:
+            break
+    if found is None:
+        raise ValueError("No tables found" if match is None else f"No tables found matching {match!r}")
+
+    head, body, _ = found
+    if not head:
+        while body and body[0][1]:  # rows of <th> cells
+            head.append(body.pop(0))
+    head = _expand_spans([cells for cells, _ in head])
+    body = _expand_spans([cells for cells, _ in body])
+    if header_row:
+        head = body[:1]
+        body = body[1:]
+    width = max(map(len, head + body), default=0)
+    head = [row + [""] * (width - len(row)) for row in head]
+    body = [row + [""] * (width - len(row)) for row in body]
+    if len(head) == 1:
+        seen = {}
+        for position, name in enumerate(head[0]):  # repeated names become 'name.1', 'name.2', ... like pd.read_html
+            seen[name] = seen.get(name, -1) + 1
+            head[0][position] = f"{name}.{seen[name]}" if seen[name] else name
+        columns = pd.Index(head[0])
+    elif head:
+        columns = pd.MultiIndex.from_arrays(head)
+    else:
+        columns = pd.RangeIndex(width)
+
+    cells = list(zip(*body)) if body else [()] * width
+    keep = np.ones(len(body), dtype=bool)
+    data = {}
+    for position, name in enumerate(columns):
+        if converters and name in converters:
+            values = [converters[name](value) for value in cells[position]]
+            keep &= np.array([value is not None for value in values], dtype=bool)
+            data[position] = pd.Series(values, dtype=None if values else object)
+        else:
+            data[position] = _typed_column(cells[position])
+    table_df = pd.DataFrame(data)
+    table_df.columns = columns
+    if not keep.all():
+        table_df = table_df[keep].reset_index(drop=True)
+    return table_df
+
+
+@functools.lru_cache(maxsize=8)
+def _schedule_date_parser(season):
+    '''
+    Builds a converter that reads the DATE cells of an ESPN schedule (ie. "Wed, Jan 13") as dates in the given season.
+    ESPN leaves out the year, so months from August on belong to the year the season starts in and earlier months to
+    the year it ends in.
+    :param season (int): the year the season ends in (ie. 2021 for 2020-2021)
+    :return: a function that returns a pd.Timestamp, or None for cells that are not dates
+    '''
+    @functools.lru_cache(maxsize=None)
+    def parse(text):
+        try:
+            day = datetime.strptime(text.split(", ", 1)[-1] + " 2000", "%b %d %Y")  # 2000 allows Feb 29
+        except ValueError:
+            return None
+        return pd.Timestamp(season - 1 if day.month >= 8 else season, day.month, day.day)
+    return parse
+
+
+def parse_schedule_html(html, season=None):
+    '''
+    Parses a team's schedule page from ESPN. The schedule table is the one with a DATE cell, and its first row is the
+    header.
+    :param html (bytes or iterable): the contents of the schedule page, or its chunks as they arrive
+    :param season (int): the year the season ends in. If given, the DATE column is read as dates and rows that are not
+    games (ie. repeated headers) are left out
+    :return: a dataframe with one row per game
+    '''
+    converters = {"DATE": _schedule_date_parser(season)} if season is not None else None
+    return read_html_table(html, match="DATE", header_row=True, converters=converters)
+
+
+def _retry_session(connections=1, retries=3, backoff=0.5):
+    '''
+    Creates a session that reuses connections and retries failed requests with exponential backoff.
+    :param connections (int): the most connections kept open to the same server
+    :param retries (int): the number of times a failed request is retried
+    :param backoff (float): the backoff factor in seconds, the waits between retries are backoff * 2 ** (retry - 1)
+    :return: a requests.Session
+    '''
+    retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=(429, 500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=connections, pool_maxsize=connections, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _parse_salary_html(html):
+    '''
+    Parses a page of salaries from spotrac.
+    :param html (bytes): the contents of the page
+    :return: the last table on the page as a dataframe, or None if the page has no table
+    '''
+    try:
+        return read_html_table(html)
+    except ValueError:  # no tables on the page
+        return None
+
+
+def fetch_salary_page(url, session, cache_dir=SALARY_CACHE_DIR, max_age=SALARY_MAX_AGE, timeout=30, offline=False):
+    '''
+    Returns the salary table of one page, from an on-disk cache of the raw page and its parsed rows whenever possible.
+    A page downloaded less than max_age seconds ago is used without asking the server. After that, the server is asked
+    with the page's ETag and Last-Modified date and only sends the page again if it changed. If the server cannot be
+    reached, the cached page is used.
+    :param url (str): the address of the page
+    :param session (requests.Session): sends the request
+    :param cache_dir (str): the folder that stores the pages
+    :param max_age (float): the seconds a download is used before the server is asked again
+    :param timeout (float): seconds to wait for the server before a request fails
+    :param offline (bool): never ask the server, the page must be cached
+    :return: the last table on the page as a dataframe, or None if the page has no table
+    '''
+    key = hashlib.sha256(url.encode()).hexdigest()[:16]
+    html_path, rows_path, meta_path = [os.path.join(cache_dir, f"{key}.{extension}")
+                                       for extension in ['html', 'feather', 'json']]
+    meta = None
+    if os.path.exists(meta_path) and os.path.exists(html_path):
+        with open(meta_path) as file:
+            meta = json.load(file)
+
+    def cached_rows():
+        if meta.get('rows') and feather is not None and os.path.exists(rows_path):
+            return _read_feather_copy(rows_path, meta['rows'])
+        with open(html_path, 'rb') as file:
+            return _parse_salary_html(file.read())
+
+    if meta is not None and (offline or time.time() - meta['fetched'] < max_age):
+        return cached_rows()
+    if offline:
+        raise FileNotFoundError(f"{url} is not in the cache at {cache_dir}")
+
+    headers = {}
+    if meta is not None and meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta is not None and meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+    try:
+        response = session.get(url, headers=headers, timeout=timeout)
+        if response.status_code != 304:
+            response.raise_for_status()
+    except requests.RequestException as error:
+        if meta is None:
+            raise
+        LOGGER.warning(f"Could not download {url} ({error}), using the copy from {time.ctime(meta['fetched'])}")
+        return cached_rows()
+
+    if response.status_code == 304 and meta is not None:  # not modified
+        meta['fetched'] = time.time()
+        with open(meta_path, 'w') as file:
+            json.dump(meta, file)
+        return cached_rows()
+
+    salaries_df = _parse_salary_html(response.content)
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(html_path, 'wb') as file:
+        file.write(response.content)
+    rows = None
+    if salaries_df is not None and feather is not None:
+        rows = _write_feather_copy(salaries_df, rows_path)
+    with open(meta_path, 'w') as file:
+        json.dump({'url': url, 'fetched': time.time(), 'etag': response.headers.get('ETag'),
+                   'last_modified': response.headers.get('Last-Modified'), 'rows': rows}, file)
+    LOGGER.info(f"Downloaded {url}")
+    return salaries_df
+
+
+def fetch_salary_table(url, max_pages=1, session=None, cache_dir=SALARY_CACHE_DIR, max_age=SALARY_MAX_AGE, timeout=30,
+                       offline=False):
+    '''
+    Reads the salary table from spotrac, or from any server with the same pages, through the cache of
+    fetch_salary_page. Tables that are split over several pages are read page by page and stacked.
+    :param url (str): the page with the salaries. A url with a {page} field (ie. '.../limit-5000/page-{page}/') is
+    filled with 1, 2, ... until a page has no table, has fewer rows than the first page or max_pages pages were read
+    :param max_pages (int): the most pages to read
+    :param session (requests.Session): sends the requests, so tests can swap in a stub or point every request at a
+    local server. Defaults to a session that retries failed requests
+    :param cache_dir (str): the folder that stores the pages
+    :param max_age (float): the seconds a download is used before the server is asked again
+    :param timeout (float): seconds to wait for the server before a request fails
+    :param offline (bool): never ask the server, every page must be cached
+    :return: a dataframe with the rows of every page
+
+    Example:
+    fetch_salary_table('https://www.spotrac.com/nhl/contracts/sort-value/limit-1690/') -> 1690 contracts
+    '''
+    own_session = session is None
+    if own_session:
+        session = _retry_session()
+    try:
+        pages = []
+        for page in range(1, max_pages + 1 if '{page}' in url else 2):
+            page_df = fetch_salary_page(url.format(page=page), session, cache_dir, max_age, timeout, offline)
+            if page_df is None or len(page_df) == 0:
+                break
+            pages.append(page_df)
+            if len(page_df) < len(pages[0]):
+                break
+    finally:
+        if own_session:
+            session.close()
+    if not pages:
+        raise ValueError(f"No salary table at {url}")
+    return pd.concat(pages, ignore_index=True)
+
+
+def fetch_team_schedules(teams_info, season=None, workers=8, retries=3, backoff=0.5, timeout=10):
+    '''
+    Downloads and parses every team's schedule page exactly once. Pages are fetched on a thread pool that shares one
+    session, so connections are reused, and failed requests are retried with exponential backoff. Each page is parsed
+    as it streams in, and the rest of the page is still read after the schedule table so the connection can go back to
+    the pool (a response closed with unread data closes its connection).
+    :param teams_info (list): a list of [team abbreviation, schedule url] pairs. The urls can point anywhere (ie. a
+    local server with saved pages)
+    :param season (int): the year the season ends in. If given, the DATE columns are read as dates while parsing
+    :param workers (int): the most pages downloaded at the same time
+    :param retries (int): the number of times a failed request is retried
+    :param backoff (float): the backoff factor in seconds, the waits between retries are backoff * 2 ** (retry - 1)
+    :param timeout (float): seconds to wait for the server before a request fails
+    :return: a dictionary where the keys are the team abbreviations and the values are the parsed schedules
+
+    Example:
+    fetch_team_schedules([["ANA", 'https://www.espn.com/nhl/team/schedule/_/name/ana']]) -> {'ANA': <schedule df>}
+    '''
+    urls = list(dict.fromkeys(url for _, url in teams_info))  # every page once, even if two teams share it
+
+    with _retry_session(workers, retries, backoff) as session:
+        def fetch(url):
+            with session.get(url, timeout=timeout, stream=True) as response:
+                response.raise_for_status()
+                chunks = response.iter_content(2 ** 16)
+                schedule_df = parse_schedule_html(chunks, season)
+                for _ in chunks:  # read_html_table stops at the schedule table, empty the rest of the body
+                    pass
+                return schedule_df
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            url_schedules = dict(zip(urls, executor.map(fetch, urls)))
+
+    LOGGER.info(f"Fetched {len(urls)} schedule pages")
+    return {team: url_schedules[url] for team, url in teams_info}
+
+
+def parse_schedule_dates(schedule_df, season):
+    '''
+    Converts the DATE column of an ESPN schedule (ie. "Wed, Jan 13") to dates. ESPN leaves out the year, so months from
+    August on belong to the year the season starts in and earlier months to the year it ends in.
+    :param schedule_df (pd.Dataframe): a team's schedule, from fetch_team_schedules
+    :param season (int): the year the season ends in (ie. 2021 for 2020-2021)
+    :return: a sorted DatetimeIndex of the days the team plays on. Rows that are not dates (ie. repeated headers) are
+    left out
+
+    Example:
+    parse_schedule_dates(schedule_df, 2022) -> DatetimeIndex(['2021-10-13', '2021-10-16', ..., '2022-04-29'])
+    '''
+    if pd.api.types.is_datetime64_any_dtype(schedule_df["DATE"]):  # already read as dates by parse_schedule_html
+        return pd.DatetimeIndex(schedule_df["DATE"].unique()).sort_values()
+    month_day = schedule_df["DATE"].astype(str).str.split(", ", n=1).str[-1]
+    dates = pd.to_datetime(month_day + " 2000", format="%b %d %Y", errors='coerce').dropna()  # 2000 allows Feb 29
+    years = np.where(dates.dt.month >= 8, season - 1, season)
+    game_days = pd.to_datetime(pd.DataFrame({'year': years, 'month': dates.dt.month, 'day': dates.dt.day}))
+    return pd.DatetimeIndex(game_days.unique()).sort_values()
+
+
+def schedule_incidence_matrix(schedules, season=None):
+    '''
+    Builds a team by game day matrix that shows which days each team plays on.
+    :param schedules (dict): maps a team abbreviation to its schedule, from fetch_team_schedules
+    :param season (int): the year the season ends in. If given, the game days are parsed into sorted dates with
+    parse_schedule_dates, otherwise the DATE strings are used as they are
+    :return: a boolean dataframe with a row for every team and a column for every game day
+    '''
+    teams = list(schedules)
+    if season is None:
+        dates = [list(schedule_df["DATE"]) for schedule_df in schedules.values()]
+        all_dates = pd.Series([date for team_dates in dates for date in team_dates], dtype=object)
+    else:
+        dates = [parse_schedule_dates(schedule_df, season) for schedule_df in schedules.values()]
+        all_dates = pd.Series(np.concatenate([team_dates.to_numpy() for team_dates in dates]), dtype='datetime64[ns]')
+    codes, game_days = pd.factorize(all_dates, sort=season is not None)
+    rows = np.repeat(np.arange(len(teams)), [len(team_dates) for team_dates in dates])
+
+    incidence = np.zeros((len(teams), len(game_days)), dtype=bool)
+    incidence[rows, codes] = True
+    return pd.DataFrame(incidence, index=teams, columns=game_days)
+
+
+def _overlap_from_incidence(incidence, start=None, end=None):
+    '''
+    Counts the days that every pair of teams both play on with a single matrix product of the incidence matrix.
+    :param incidence (pd.Dataframe): the matrix from schedule_incidence_matrix
+    :param start (str): the first day to count (ie. '2022-03-21'), or None for the start of the schedule
+    :param end (str): the last day to count, or None for the end of the schedule
+    :return: a square dataframe of teams where each cell is the number of days both teams play
+    '''
+    if start is not None or end is not None:
+        incidence = incidence.loc[:, start:end]  # the columns are sorted dates
+    values = incidence.to_numpy(dtype=np.float64)  # float so the product runs on BLAS
+    overlap = (values @ values.T).round().astype(int)
+    return pd.DataFrame(overlap, index=incidence.index, columns=incidence.index)
+
+
+def schedule_overlap_matrix(schedules, season=None, start=None, end=None):
+    '''
+    Counts the days that every pair of teams both play on with a single matrix product of the incidence matrix.
+    :param schedules (dict): maps a team abbreviation to its schedule, from fetch_team_schedules
+    :param season (int): the year the season ends in, needed to count games between start and end
+    :param start (str): the first day to count (ie. '2022-03-21'), or None for the start of the season
+    :param end (str): the last day to count, or None for the end of the season
+    :return: a square dataframe of teams where each cell is the number of days both teams play. The diagonal is the
+    number of days each team plays
+    '''
+    if season is None and (start is not None or end is not None):
+        raise ValueError("A season is needed to turn the schedule into dates for a date window")
+    return _overlap_from_incidence(schedule_incidence_matrix(schedules, season), start, end)
+
+
+def batch_overlap_matrices(season_schedules, windows):
+    '''
+    Builds the overlap matrix for many seasons and date windows in one go. Each season's incidence matrix is built once
+    and every window of that season is a slice of it, so nothing is fetched or parsed twice.
+    :param season_schedules (dict): maps a season (the year it ends in) to the schedules from fetch_team_schedules
+    :param windows (dict): maps a name to a (season, first day, last day) tuple, where the days can be None to use the
+    start or end of the season
+    :return: a dictionary where the keys are the window names and the values are the overlap matrices
+
+    Example:
+    batch_overlap_matrices({2022: schedules}, {'Fantasy Playoffs': (2022, '2022-03-21', '2022-04-10')})
+    -> {'Fantasy Playoffs': <overlap df>}
+    '''
+    incidences = {season: schedule_incidence_matrix(schedules, season)
+                  for season, schedules in season_schedules.items()}
+    return {name: _overlap_from_incidence(incidences[season], start, end)
+            for name, (season, start, end) in windows.items()}
+
+
+def best_goalie_portfolios(schedules, k, season=None, start=None, end=None, objective='coverage', n_best=10):
+    '''
+    Finds the combinations of k teams whose goalies together cover the most game days, or that play on the same day
+    the least. Each team's game days are stored as the bits of an integer, so the days a combination covers are the
+    bits of the OR of its teams. The search adds teams one at a time and drops a branch once an optimistic estimate of
+    its best possible score cannot beat the n_best combinations already found.
+    :param schedules (dict): maps a team abbreviation to its schedule, from fetch_team_schedules
+    :param k (int): the number of goalies (teams) to pick
+    :param season (int): the year the season ends in, needed to only count games between start and end
+    :param start (str): the first day to count (ie. '2022-03-21'), or None for the start of the season
+    :param end (str): the last day to count, or None for the end of the season
+    :param objective (str): 'coverage' to maximize the days with at least one game, or 'collisions' to minimize the
+    games that are played on a day another picked team also plays
+    :param n_best (int): the number of combinations to return
+    :return: a dataframe with the columns "Teams", "# Days Covered" and "# Same Day Games", best combination first
+
+    Example:
+    best_goalie_portfolios(schedules, 2) -> Teams: "ANA & TOR", # Days Covered: 98, # Same Day Games: 14, ...
+    '''
+    if objective not in ('coverage', 'collisions'):
+        raise ValueError(f"Unknown objective {objective}, use 'coverage' or 'collisions'")
+    if season is None and (start is not None or end is not None):
+        raise ValueError("A season is needed to turn the schedule into dates for a date window")
+    incidence = schedule_incidence_matrix(schedules, season)
+    if start is not None or end is not None:
+        incidence = incidence.loc[:, start:end]
+
+    # Teams with the most games go first so good combinations are found early and prune the rest
+    games = incidence.sum(axis=1).sort_values(ascending=False, kind='stable')
+    teams = list(games.index)
+    bits = [int("".join('1' if day else '0' for day in incidence.loc[team]) or '0', 2) for team in teams]
+    games = games.tolist()
+    best = []  # heap of (score, -order, combination) so the worst kept combination is at best[0]
+    order = [0]
+
+    def keep(score, combination):
+        item = (score, -order[0], combination)
+        order[0] += 1
+        if len(best) < n_best:
+            heapq.heappush(best, item)
+        elif item > best[0]:
+            heapq.heapreplace(best, item)
+
+    def search(first, combination, covered, total):
+        remaining = k - len(combination)
+        if remaining == 0:
+            keep(bin(covered).count('1') if objective == 'coverage' else bin(covered).count('1') - total, combination)
+            return
+        candidates = range(first, len(teams) - remaining + 1)
+        if len(best) == n_best:
+            if objective == 'coverage':
+                # At best, the remaining teams each add every one of their days that is not covered yet
+                gains = sorted((bin(bits[j] & ~covered).count('1') for j in range(first, len(teams))), reverse=True)
+                if bin(covered).count('1') + sum(gains[:remaining]) <= best[0][0]:
+                    return
+            elif bin(covered).count('1') - total <= best[0][0]:
+                return  # collisions only go up as teams are added
+        for j in candidates:
+            search(j + 1, combination + (j,), covered | bits[j], total + games[j])
+
+    search(0, (), 0, 0)
+
+    rows = []
+    for _, _, combination in sorted(best, reverse=True):
+        covered = 0
+        for j in combination:
+            covered |= bits[j]
+        days_covered = bin(covered).count('1')
+        rows.append({'Teams': " & ".join(teams[j] for j in combination), '# Days Covered': days_covered,
+                     '# Same Day Games': sum(games[j] for j in combination) - days_covered})
+    return pd.DataFrame(rows, columns=['Teams', '# Days Covered', '# Same Day Games'])
+
+
+def _pair_chunk(teams, overlap, first, second, start):
+    '''
+    Builds the rows of the non overlapping games table for the given pairs of team positions.
+    :param teams (np.ndarray): the team abbreviations
+    :param overlap (np.ndarray): the square matrix of games on the same day, with each team's games on the diagonal
+    :param first (np.ndarray): the position of the first team of every pair
+    :param second (np.ndarray): the position of the second team of every pair
+    :param start (int): the row number of the first pair in the full table
+    :return: a dataframe with the columns "Teams" and "# Non-Overlapping Games"
+    '''
+    # A pair's games on different days are both teams' games less the days they both play
+    games = np.diag(overlap)
+    return pd.DataFrame({'Teams': teams[first] + " & " + teams[second],
+                         '# Non-Overlapping Games': games[first] + games[second] - overlap[first, second]},
+                        index=pd.RangeIndex(start, start + len(first)))
+
+
+def iter_non_overlapping_games(overlap_df, chunk_size=None):
+    '''
+    Yields the table of non overlapping games in chunks. The pairs are collected into preallocated arrays of team
+    positions and every chunk is built in one go, so a large league never needs the whole table in memory.
+    :param overlap_df (pd.Dataframe): the square matrix from schedule_overlap_matrix
+    :param chunk_size (int): the most rows in a chunk. By default the whole table is one chunk
+    :return: a generator of dataframes with the columns "Teams" and "# Non-Overlapping Games", with the pairs in the
+    same order as looping through the teams and the row numbers of the full table as the index
+    '''
+    teams = np.asarray(overlap_df.index, dtype=object)
+    overlap = overlap_df.to_numpy()
+    n_pairs = len(teams) * (len(teams) - 1) // 2
+    chunk_size = chunk_size or max(n_pairs, 1)
+
+    first = np.empty(chunk_size, dtype=np.intp)
+    second = np.empty(chunk_size, dtype=np.intp)
+    filled = 0
+    start = 0
+    for i in range(len(teams) - 1):
+        partners = np.arange(i + 1, len(teams))
+        while partners.size:
+            taken = partners[:chunk_size - filled]
+            first[filled:filled + taken.size] = i
+            second[filled:filled + taken.size] = taken
+            filled += taken.size
+            partners = partners[taken.size:]
+            if filled == chunk_size:
+                yield _pair_chunk(teams, overlap, first, second, start)
+                start += filled
+                filled = 0
+    if filled:
+        yield _pair_chunk(teams, overlap, first[:filled], second[:filled], start)
+
+
+def non_overlapping_games_table(overlap_df):
+    '''
+    Lists the number of non overlapping games for every pair of teams.
+    :param overlap_df (pd.Dataframe): the square matrix from schedule_overlap_matrix
+    :return: a dataframe with the columns "Teams" (ie. "ANA & ARI") and "# Non-Overlapping Games", with the pairs in
+    the same order as looping through the teams
+    '''
+    chunks = list(iter_non_overlapping_games(overlap_df))
+    if not chunks:
+        return pd.DataFrame(columns=["Teams", "# Non-Overlapping Games"])
+    return chunks[0]
+
+
+def write_non_overlapping_games(overlap_df, path, chunk_size=10000):
+    '''
+    Streams the table of non overlapping games to a CSV or Excel file chunk by chunk. Excel files are written with a
+    write-only workbook and get the square matrix of games on the same day on a second sheet.
+    :param overlap_df (pd.Dataframe): the square matrix from schedule_overlap_matrix
+    :param path (str): the output file, ending in .csv or .xlsx
+    :param chunk_size (int): the number of rows held in memory at a time
+    :return: the number of pairs written
+    '''
+    columns = ["Teams", "# Non-Overlapping Games"]
+    n_rows = 0
+    if path.endswith('.csv'):
+        pd.DataFrame(columns=columns).to_csv(path)  # header row only
+        for chunk in iter_non_overlapping_games(overlap_df, chunk_size):
+            chunk.to_csv(path, mode='a', header=False)
+            n_rows += len(chunk)
+        return n_rows
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Sheet1')
+    sheet.append([None] + columns)
+    for chunk in iter_non_overlapping_games(overlap_df, chunk_size):
+        for row in chunk.itertuples():
+            sheet.append(list(row))
+        n_rows += len(chunk)
+
+    matrix_sheet = workbook.create_sheet('Games on the Same Day')
+    matrix_sheet.append([None] + list(overlap_df.columns))
+    for team, row in zip(overlap_df.index, overlap_df.to_numpy().tolist()):
+        matrix_sheet.append([team] + row)
+    workbook.save(path)
+    return n_rows
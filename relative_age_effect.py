@@ -3,17 +3,18 @@ The Relative Age Effect (RAE) describes the “the phenomenon by which children
 more highly than children born later in the same cohort”.
 
 This file creates multiple histograms to determine if RAE impacts the number of players in the NHL and their PPG.
+
+Run it with --headless to save the plots as files instead of showing them, ie. on a server without a display:
+python relative_age_effect.py --headless --output-dir Plots --formats png svg
 """
 
 # Imports
+import argparse
 import logging as LOGGER
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.pyplot as plt2
-import matplotlib.pyplot as plt3
-import matplotlib.pyplot as plt4
-from functions import calculate_quarter, calculate_ppg_by_qtr_yr
+from functions import (add_birth_date_features, birth_month_chi_square, calculate_cohort_cubes, cohort_mask,
+                       draw_month_bars, draw_quarter_bars, quarter_ppg_test, render_plots, rollup_birth_cube)
 
 # Setup
 pd.options.display.max_rows = 500
@@ -23,151 +24,144 @@ LOGGER.getLogger().setLevel(LOGGER.INFO)
 # Configurations
 FILE_NAME = "Data/Bio Info.xlsx"  # all data as of May 4, 2020
 MONTHS = ["JAN", "FEB", "MAR", "APR", "MAY", "JUNE", "JULY", "AUG", "SEPT", "OCT", "NOV", "DEC"]
-BIRTH_YEARS = [1977, 1978, 1979, 1980, 1981, 1982, 1983, 1984, 1985, 1986, 1987, 1988, 1989,
-               1990, 1991, 1992, 1993, 1994, 1995, 1996, 1997, 1998, 1999, 2000, 2001]
-QUARTERS_DICT = {1: "Q1 = Jan-Mar", 2: "Q1 = Jan-Mar", 3: "Q1 = Jan-Mar",
-                 4: "Q2 = Apr-Jun", 5: "Q2 = Apr-Jun", 6: "Q2 = Apr-Jun",
-                 7: "Q3 = Jul-Sep", 8: "Q3 = Jul-Sep", 9: "Q3 = Jul-Sep",
-                 10: "Q4 = Oct-Dec", 11: "Q4 = Oct-Dec", 12: "Q4 = Oct-Dec"}
+# Every cohort gets its own set of plots. Filters map a column of the data to a value, a list of values or a function,
+# ie. {'Forwards': {'Pos': ['C', 'L', 'R']}, 'Europeans': {'Ctry': ['SWE', 'FIN', 'RUS', 'CZE']},
+#      'Drafted 2010-2015': {'Draft Yr': lambda year: pd.to_numeric(year, errors='coerce').between(2010, 2015)},
+#      'Debuted since 2015-16': {'1st Season': lambda season: season >= 20152016}}
+COHORTS = {'All Players': {}}
+TEST_RESAMPLES = 100000  # bootstrap and permutation resamples of the Q1 vs Q4 points per game test
+OUTPUT_DIR = "Plots"  # where --headless saves the plots
+OUTPUT_FORMATS = ["png", "svg"]
+
+# Command line
+parser = argparse.ArgumentParser(description="Plots the relative age effect of active NHL players.")
+parser.add_argument('--headless', action='store_true', help="save the plots to files instead of showing them")
+parser.add_argument('--output-dir', default=OUTPUT_DIR, help="the folder to save the plots in")
+parser.add_argument('--formats', nargs='+', default=OUTPUT_FORMATS, help="the file extensions to save, ie. png svg")
+parser.add_argument('--workers', type=int, default=None,
+                    help="the number of processes to resample and draw with (defaults to the number of CPUs)")
+args = parser.parse_args()
 
 # Read data
 bio_info = pd.read_excel(FILE_NAME)
 LOGGER.info(f"Shape of data: {bio_info.shape}")
 
+# Add the birth month, quarter and year of every player, then count players, points and games for every cohort, birth
+# year and month in one pass. Every plot below reads from this cube. The years span the oldest to the youngest player.
+# add_birth_date_features, calculate_cohort_cubes and rollup_birth_cube are defined in functions.py
+bio_info = add_birth_date_features(bio_info)
+birth_cube = calculate_cohort_cubes(bio_info, COHORTS)
+month_df = rollup_birth_cube(birth_cube, ['Cohort', 'Birth Month'])
+year_qtr_df = rollup_birth_cube(birth_cube, ['Cohort', 'Birth Year', 'Birth Quarter'])
+birth_years = birth_cube.index.get_level_values('Birth Year').unique().tolist()
+
+# Plots of filtered cohorts are named after them
+suffixes = {cohort: f" ({cohort})" if filters else "" for cohort, filters in COHORTS.items()}
+
+# Every plot is stored as its file name: (draw function, arguments) and drawn at the end
+# draw_month_bars and draw_quarter_bars are defined in functions.py
+plots = {}
+
 """
 PART 1: Determine the number of active NHL players born in each month.##################################################
 """
 
-# Create a column in df for birth months and count frequency
-bio_info['Birth Months'] = bio_info['DOB'].apply(lambda birthday: birthday.split('-')[1]).astype(int)
-month_freq = bio_info['Birth Months'].value_counts().sort_index().tolist()
+for cohort, suffix in suffixes.items():
+    # Count frequency of birth months
+    month_freq = month_df.loc[cohort, 'Players'].tolist()
+
+    # Create bar graph with labels
+    plots[f"Plot 1 Birth Months{suffix}"] = (draw_month_bars, {
+        'values': month_freq,
+        'labels': MONTHS,
+        'ylabel': "Number of Active NHL Players",
+        'title': f"Plot 1: Birth Months of Active NHL Players{suffix}",
+        'ylim': 100 if not suffix else max(100, max(month_freq) + 10)})  # the original chart keeps its axis
 LOGGER.info("Calculated birth month frequencies")
 
-# Create bar graph
-x_index = np.arange(len(MONTHS))
-fig, ax = plt.subplots()
-frequency_bars = ax.bar(x_index, month_freq, align="center", alpha=0.9)
-ax.set_ylim(top=100)
-ax.set_xticks(x_index)
-ax.set_xticklabels(MONTHS, fontsize=9)
-ax.set_ylabel("Number of Active NHL Players")
-ax.set_xlabel("Birth Month")
-ax.set_title("Plot 1: Birth Months of Active NHL Players")
-
-# Add labels
-for i in x_index:
-    ax.annotate(str(month_freq[i]),
-                xy=(frequency_bars[i].get_x() + 0.4,
-                    month_freq[i]),
-                xytext=(0, 0),
-                textcoords='offset points',
-                ha='center',
-                va='bottom')
-plt.show()
-LOGGER.info("Created first bar graph with labels")
-
 """
 PART 2: Points per game by birth month.#################################################################################
 """
 
-# Calculate points per game by birth month
-bio_info['Birth Months'] = bio_info['DOB'].apply(lambda birthday: birthday.split('-')[1]).astype(int)
-ppg_df = bio_info.groupby('Birth Months').agg({'P': sum, 'GP': sum})
-ppg_df['Points per Game'] = ppg_df['P'] / ppg_df['GP']
-ppg_month = ppg_df['Points per Game'].tolist()
+for cohort, suffix in suffixes.items():
+    # Points per game by birth month
+    ppg_month = month_df.loc[cohort, 'PPG'].tolist()
+
+    # Create bar graph with labels
+    plots[f"Plot 2 PPG by Birth Month{suffix}"] = (draw_month_bars, {
+        'values': ppg_month,
+        'labels': MONTHS,
+        'ylabel': "Average Points Per Game",
+        'title': f"Plot 2: Average PPG for Active NHL Players Born in Each Month{suffix}",
+        'decimals': 2})
 LOGGER.info("Calculated birth month points per game")
 
-# Create bar graph
-x_index2 = np.arange(len(MONTHS))
-fig2, ax2 = plt2.subplots()
-ppg_bars = ax2.bar(x_index2, ppg_month, align="center", alpha=0.9)
-ax2.set_xticks(x_index2)
-ax2.set_xticklabels(MONTHS, fontsize=9)
-ax2.set_ylabel("Average Points Per Game")
-ax2.set_xlabel("Birth Month")
-ax2.set_title("Plot 2: Average PPG for Active NHL Players Born in Each Month")
-
-# Add labels
-for i in x_index2:
-    ax2.annotate(round(ppg_month[i], 2),
-                 xy=(ppg_bars[i].get_x() + 0.4,
-                     ppg_month[i]),
-                 xytext=(0, 0),
-                 textcoords='offset points',
-                 ha='center',
-                 va='bottom')
-plt2.show()
-LOGGER.info("Created second bar graph with labels")
-
 """
 PART 3: Active players born in each quarter by year.####################################################################
 """
 
-# Create 4 lists showing frequencies of birth quarters per year
-q1, q2, q3, q4 = [0] * 25, [0] * 25, [0] * 25, [0] * 25
-
-for birthday in bio_info['DOB'].tolist():
-    year = int(birthday[:4])
-    month = int(birthday[5:7])
-    if month <= 3:
-        q1[year - 1977] += 1
-    elif month <= 6:
-        q2[year - 1977] += 1
-    elif month <= 9:
-        q3[year - 1977] += 1
-    else:
-        q4[year - 1977] += 1
+for cohort, suffix in suffixes.items():
+    # Create 4 lists showing frequencies of birth quarters per year
+    qtr_freq_df = year_qtr_df.loc[cohort, 'Players'].unstack()
+    q1, q2, q3, q4 = [qtr_freq_df[qtr].tolist() for qtr in range(1, 5)]
+
+    # Create the histogram
+    plots[f"Plot 3 Birth Quarters by Year{suffix}"] = (draw_quarter_bars, {
+        'quarters': [q1, q2, q3, q4],
+        'years': birth_years,
+        'ylabel': "Number of Birthdays",
+        'title': f"Plot 3: Active NHL Players Born in Each Quarter by Year{suffix}",
+        'yticks': np.arange(0, qtr_freq_df.to_numpy().max() + 10, 5)})
 LOGGER.info("Calculated frequency of birth quarters per year")
 
-# Create the histogram
-x_index3 = np.arange(len(BIRTH_YEARS))
-width = 0.15
-fig3, ax3 = plt.subplots()
-rects1 = ax3.bar(x_index3 - 1.5 * width, q1, width, label="Q1 = Jan-Mar")
-rects2 = ax3.bar(x_index3 - width / 2, q2, width, label="Q2 = Apr-Jun")
-rects3 = ax3.bar(x_index3 + width / 2, q3, width, label="Q3 = Jul-Sep")
-rects4 = ax3.bar(x_index3 + 1.5 * width, q4, width, label="Q4 = Oct-Dec")
-
-ax3.set_xticks(x_index3)
-ax3.set_xticklabels(BIRTH_YEARS, fontsize=11)
-ax3.set_ylabel("Number of Birthdays")
-ax3.set_yticks(np.arange(0, 45, 5))
-ax3.set_xlabel("Birth Year")
-ax3.set_title("Plot 3: Active NHL Players Born in Each Quarter by Year")
-ax3.legend(prop={'size': 15})
-fig3.set_size_inches(18, 10)
-plt3.show()
-LOGGER.info("Created third bar graph with labels")
-
 """
 PART 4: Points per game of active players born in each quarter by year.#################################################
 """
 
-# Calculate a player's birth quarter and year. calculate_quarter is defined in functions.py
-bio_info['Birth Quarter'] = bio_info['DOB'].apply(lambda dob: calculate_quarter(dob))
-bio_info['Birth Year'] = bio_info['DOB'].apply(lambda dob: int(dob[0:4]))
-
-# Calculate the points per game for every quarter split by year. calculate_ppg_by_qtr_yr is defined in function.py
-q1_ppg = calculate_ppg_by_qtr_yr(bio_info, [1977, 2001], "Q1 = Jan-Mar")
-q2_ppg = calculate_ppg_by_qtr_yr(bio_info, [1977, 2001], "Q2 = Apr-Jun")
-q3_ppg = calculate_ppg_by_qtr_yr(bio_info, [1977, 2001], "Q3 = Jul-Sep")
-q4_ppg = calculate_ppg_by_qtr_yr(bio_info, [1977, 2001], "Q4 = Oct-Dec")
-
-# Create the histogram
-x_index4 = np.arange(len(BIRTH_YEARS))
-width = 0.15
-fig4, ax4 = plt.subplots()
-rects1 = ax4.bar(x_index4 - 1.5 * width, q1_ppg, width, label="Q1 = Jan-Mar")
-rects2 = ax4.bar(x_index4 - width / 2, q2_ppg, width, label="Q2 = Apr-Jun")
-rects3 = ax4.bar(x_index4 + width / 2, q3_ppg, width, label="Q3 = Jul-Sep")
-rects4 = ax4.bar(x_index4 + 1.5 * width, q4_ppg, width, label="Q4 = Oct-Dec")
-
-ax4.set_xticks(x_index4)
-ax4.set_xticklabels(BIRTH_YEARS, fontsize=11)
-ax4.set_ylabel("Points per Game")
-ax4.set_xlabel("Birth Year")
-ax4.set_title("Plot 4: Points Per Game of Active NHL Players Born in Each Quarter by Year")
-ax4.legend(prop={'size': 15})
-fig4.set_size_inches(18, 10)
-plt4.show()
-LOGGER.info("Created fourth bar graph with labels")
+for cohort, suffix in suffixes.items():
+    # Points per game for every quarter split by year (0 for a year with no games played)
+    qtr_ppg_df = year_qtr_df.loc[cohort, 'PPG'].unstack()
+    q1_ppg, q2_ppg, q3_ppg, q4_ppg = [qtr_ppg_df[qtr].tolist() for qtr in range(1, 5)]
+
+    # Create the histogram
+    plots[f"Plot 4 PPG by Birth Quarter and Year{suffix}"] = (draw_quarter_bars, {
+        'quarters': [q1_ppg, q2_ppg, q3_ppg, q4_ppg],
+        'years': birth_years,
+        'ylabel': "Points per Game",
+        'title': f"Plot 4: Points Per Game of Active NHL Players Born in Each Quarter by Year{suffix}"})
+LOGGER.info("Calculated points per game of birth quarters per year")
+
+"""
+PART 5: Test whether the differences between birth months and quarters are significant.#################################
+"""
+
+# Chi-square test of the birth months against birthdays spread evenly over the year, then a bootstrap confidence
+# interval and a permutation test of the difference in PPG between players born in Q1 and Q4
+# cohort_mask, birth_month_chi_square and quarter_ppg_test are defined in functions.py
+for cohort, filters in COHORTS.items():
+    cohort_info = bio_info[cohort_mask(bio_info, filters)]
+    chi_square = birth_month_chi_square(cohort_info)
+    LOGGER.info(f"{cohort}: birth months chi-square = {chi_square['chi2']:.2f} with {chi_square['dof']} degrees of "
+                f"freedom, p-value = {chi_square['p_value']:.4g}")
+
+    ppg_test = quarter_ppg_test(cohort_info, first=1, second=4, n_resamples=TEST_RESAMPLES, workers=args.workers)
+    LOGGER.info(f"{cohort}: Q1 PPG - Q4 PPG = {ppg_test['difference']:.3f}, 95% confidence interval "
+                f"[{ppg_test['ci_low']:.3f}, {ppg_test['ci_high']:.3f}], p-value = {ppg_test['p_value']:.4g}")
+
+"""
+Draw the plots.#########################################################################################################
+"""
+
+if args.headless:
+    # render_plots is defined in functions.py
+    paths = render_plots(plots, args.output_dir, args.formats, workers=args.workers)
+    LOGGER.info(f"Saved {', '.join(paths)}")
+else:
+    # pyplot is only needed to open windows, so a headless run never loads a display backend
+    import matplotlib.pyplot as plt
+
+    for name, (draw, kwargs) in plots.items():
+        fig, ax = plt.subplots()
+        draw(ax, **kwargs)
+        plt.show()
+        LOGGER.info(f"Created {name}")
@@ -11,14 +11,14 @@ For the 2019-20 and 2020-21 seasons, we will use the player's 2018-19 data.
 
 # Imports
 import logging as LOGGER
-import requests
 import pandas as pd
-import itertools
 
 from sklearn.model_selection import train_test_split
 import statsmodels.api as sm
 from statsmodels.tools.eval_measures import meanabs
-from functions import create_summary_df
+from functions import (SeasonRegistry, best_subsets_by_rss, clean_stats_columns, elastic_net_cv, fetch_salary_table,
+                       fit_ols, fit_ols_groups, parse_contract_columns, save_salary_model, subset_cv_mae,
+                       subset_regression_mae)
 
 # Setup
 pd.options.display.max_rows = 500
@@ -26,92 +26,83 @@ pd.options.display.max_columns = 500
 LOGGER.getLogger().setLevel(LOGGER.INFO)
 
 # Configurations
-SALARY_URL = 'https://www.spotrac.com/nhl/contracts/sort-value/limit-1690/'
+SALARY_URL = 'https://www.spotrac.com/nhl/contracts/sort-value/limit-1690/'  # may have a {page} field, see below
+SALARY_PAGES = 1  # most pages read from a SALARY_URL with a {page} field
+SALARY_MAX_AGE = 24 * 60 * 60  # seconds a downloaded salary page is used before spotrac is asked for changes
+OFFLINE = False  # only use the salary pages saved in Data/.cache/salaries, never the network
 STATS_YEAR_DICT = {2013: 2012, 2020: 2019, 2021: 2019, 2022: 2019}
+LOAD_WORKERS = 1  # number of processes that read the Excel files - more than 1 needs a platform that forks (Linux)
+SEARCH_WORKERS = 1  # number of processes for the best model search - more than 1 needs a platform that forks (Linux)
+SEARCH_MODE = 'exhaustive'  # 'exhaustive' (every subset), 'top_k' (only keep the best subsets), 'branch_and_bound',
+# 'cv' (score every subset with repeated k-fold cross-validation and keep the best ones) or 'elastic_net' (pick the
+# features with a lasso / elastic net path scored by the same cross-validation, which also works for many more features)
+SEARCH_TOP_K = 10  # subsets kept by 'top_k' and 'cv', and subsets kept per model size by 'branch_and_bound'
+CV_SPLITS = 10  # folds for SEARCH_MODE = 'cv'
+CV_REPEATS = 1  # times the folds are reshuffled for SEARCH_MODE = 'cv'
+L1_RATIO = 1.0  # 1 for the lasso, between 0 and 1 for the elastic net, for SEARCH_MODE = 'elastic_net'
+OLS_BACKEND = 'cholesky'  # how 'branch_and_bound' fits its models: 'cholesky', 'lstsq' or 'statsmodels'
+MODEL_FILE = 'Data/salary_model.json'  # where the best model is saved for predict_salary
+# NHL salary cap (upper limit) in millions, by the year the season starts. 2012-13 is the full cap before the lockout
+SALARY_CAPS = {2005: 39.0, 2006: 44.0, 2007: 50.3, 2008: 56.7, 2009: 56.8, 2010: 59.4, 2011: 64.3, 2012: 70.2,
+               2013: 64.3, 2014: 69.0, 2015: 71.4, 2016: 73.0, 2017: 75.0, 2018: 79.5, 2019: 81.5, 2020: 81.5,
+               2021: 81.5, 2022: 82.5, 2023: 83.5}
+BATCH_TARGETS = ['AAV', 'Cap Hit %']  # targets the best features are refitted for in PART 3
+BATCH_GROUPINGS = {'All Players': None, 'Stats Year': 'Stats Year', 'Position': 'Pos',
+                   'Contract Length': 'Contract Years'}  # groupings fitted in PART 3, name: column(s) or None for all
 
 """
 PART 1: Data Prep ######################################################################################################
 """
 
-# Scrape the contents of the website
-html = requests.get(SALARY_URL).content
-salaries_list = pd.read_html(html)
-salaries_df = salaries_list[-1]
-LOGGER.info("Successfully pulled salary information from online")
+# Scrape the contents of the website, fetch_salary_table is defined in functions.py
+# The pages and their parsed rows are saved in Data/.cache/salaries, so repeated runs neither download nor parse the
+# page again. SALARY_URL can also point at a local copy of the site (ie. 'http://localhost:8000/limit-{page}.html')
+salaries_df = fetch_salary_table(SALARY_URL, max_pages=SALARY_PAGES, max_age=SALARY_MAX_AGE, offline=OFFLINE)
+LOGGER.info("Successfully pulled salary information")
 
 """
 First, we identify the player's signing year given the website's data.
 
 Note that the "Player" column in salaries_df has the following format:
 "FIRSTNAME LASTNAME POSITION | SIGNINGYEAR-YYYY (FA: YYYY)"
-We want to grab SIGNINGYEAR for every player.
-
-To do this, we use the following methodology:
-1) Split the string by '-', which produces a list. Note this list does not necessarily have a length of 2 because there
-can be dashes in the player's name (ie. Oliver Ekman-Larsson)
-2) Take the second last element in the list because it will contain the signing year. We do this by slicing [-2:-1]
-This step returns a single element list. To only grab the string within the list, we write [0]
-3) Take the last 4 characters of the list with [-4:0] and this will return the year.
+We want to grab SIGNINGYEAR for every player, and keep only FIRSTNAME LASTNAME in the player column because we will use
+it as a merge key.
+
+SIGNINGYEAR is the last 4 characters before the last '-'. Note there can be dashes in the player's name
+(ie. Oliver Ekman-Larsson), so we cannot take the first '-'.
 """
 
-salaries_df['Signing Year'] = salaries_df['Player'].apply(lambda info: (((info.split('-'))[-2:-1])[0])[-4:]).astype(int)
-LOGGER.info("Finished creating a column for signing year")
+# parse_contract_columns is defined in functions.py
+salaries_df = parse_contract_columns(salaries_df)
+LOGGER.info("Finished creating columns for signing year and player names")
 
 # Stats year will be the column that indicates what season we should take stats from (to account for shortened seasons)
-salaries_df['Stats Year'] = salaries_df['Signing Year'].map(STATS_YEAR_DICT).fillna(salaries_df['Signing Year'])
+# SeasonRegistry is defined in functions.py. It finds the seasons in Data/ but only reads the ones a contract needs.
+seasons = SeasonRegistry(stats_year_dict=STATS_YEAR_DICT, workers=LOAD_WORKERS)
+salaries_df['Stats Year'] = seasons.stats_years(salaries_df['Signing Year'])
 LOGGER.info("Finished creating a column for stats year")
 
-# Replace the player column with only the player's first and last name - we will use this column as a merge key.
-salaries_df['Player'] = salaries_df['Player'].apply(lambda info: (info.split(" "))[0] + " " + (info.split(" "))[1])
-LOGGER.info("Finished creating a column for player names")
-
-# NHL stats for 2008-2019
+# NHL stats for 2008-2019, only for the seasons that a contract takes stats from
 # We don't need all of the 08-11 data because the players in salaries_df with a signing year in 08-11 are included
 # in the first few pages.
-stats_08_df = pd.read_excel("Data/08Summary.xlsx")
-stats_08_df['Year'] = 2008
-stats_09_df = pd.read_excel("Data/09Summary.xlsx")
-stats_09_df['Year'] = 2009
-stats_10_df = pd.read_excel("Data/10Summary.xlsx")
-stats_10_df['Year'] = 2010
-stats_11_df = pd.read_excel("Data/11Summary.xlsx")
-stats_11_df['Year'] = 2011
-stats_12_df = create_summary_df('12')  # create_summary_df is defined in functions.py
-stats_14_df = create_summary_df('14')
-stats_15_df = create_summary_df('15')
-stats_16_df = create_summary_df('16')
-stats_17_df = create_summary_df('17')
-stats_18_df = create_summary_df('18')
-stats_19_df = create_summary_df('19')
-
-all_stats_df = pd.concat([stats_08_df, stats_09_df, stats_10_df, stats_11_df, stats_12_df, stats_14_df, stats_15_df,
-                          stats_16_df, stats_17_df, stats_18_df, stats_19_df])
+all_stats_df = seasons.stats_for(salaries_df['Stats Year'])
 LOGGER.info("Finished merging NHL statistics from 2008-2019")
 
 # Merge salaries_df and all_stats_df
-reg_data_df = salaries_df[['Player', 'Stats Year', 'Signed Age', 'AAV']].merge(all_stats_df, how='inner',
-                                                                               left_on=['Player', 'Stats Year'],
-                                                                               right_on=['Player', 'Year'])
+reg_data_df = salaries_df[['Player', 'Stats Year', 'Signed Age', 'AAV', 'Signing Year', 'Contract Years']].merge(
+    all_stats_df, how='inner', left_on=['Player', 'Stats Year'], right_on=['Player', 'Year'])
 LOGGER.info("Finished merging salaries and statistics")
 
-# Clean the AAV column by removing dollar signs and commas. Divide by 1 million to simplify values.
-reg_data_df['AAV'] = reg_data_df['AAV'].apply(lambda aav: (int("".join(aav.strip("$").split(","))) / 1000000))
-
-# Convert TOI/GP to an integer value
-reg_data_df['TOI/GP'] = reg_data_df['TOI/GP'].apply(
-    lambda time: int(time.split(":")[0]) + (int(time.split(":")[1]) / 60))
-
-# Replace invalid shooting percentage
-reg_data_df['S%'].replace({'--': 0}, inplace=True)
-
-# Replace invalid faceoff percentage
-reg_data_df['FOW%'].replace({'--': 0}, inplace=True)
+# Clean the AAV column by removing dollar signs and commas and dividing by 1 million to simplify values, convert TOI/GP
+# to minutes, replace invalid shooting and faceoff percentages with 0 and make signed age an integer
+# clean_stats_columns is defined in functions.py
+reg_data_df = clean_stats_columns(reg_data_df)
 
 # Drop index column
 reg_data_df.drop(columns=['index'], inplace=True)
 
-# Convert signed age to integer
-reg_data_df['Signed Age'] = reg_data_df['Signed Age'].astype(int)
+# The AAV as a percent of the salary cap of the contract's first season, so contracts from different years compare
+reg_data_df['Cap Hit %'] = 100 * reg_data_df['AAV'] / reg_data_df['Signing Year'].map(SALARY_CAPS)
 LOGGER.info("Finished cleaning columns for modelling")
 
 """
@@ -130,7 +121,8 @@ salary_values = reg_data_df['AAV'].values  # target for model
 
 # INITIAL MODEL ########################################################################################################
 # Note that the initial model only used stats from the 2018-2019 season.
-# To replicate results as discussed in the analysis, set reg_data_df['Stats Year'] = 2019.
+# To replicate results as discussed in the analysis, set reg_data_df['Stats Year'] = 2019. PART 3 also fits the best
+# model on each stats year separately.
 
 features = ['G', 'A', 'TOI/GP', '+/-', 'PPP', 'GP']
 
@@ -157,25 +149,54 @@ print("Mean Absolute Error: " + str(meanabs(sal_test, sal_pred, axis=0)))
 
 # BEST POSSIBLE MODEL ##################################################################################################
 
-# List of possible features - removed SHG, SHP, OTG, GWG because they are too rare to be considered as features and
-# it will reduce code run time
-possible_features = ['Signed Age', 'GP', 'G', 'A', 'P', '+/-', 'PIM', 'P/GP', 'EVG', 'EVP', 'PPG', 'PPP', 'S', 'S%',
-                     'TOI/GP', 'FOW%']
-feature_mae_dict = {}
-
-# Loop through all possible features to identify the combination that results in the smallest MAE.
-for i in range(1, len(possible_features) + 1):
-    for subset in itertools.combinations(possible_features, i):
-        features = reg_data_df[list(subset)].values
-        var_train, var_test, sal_train, sal_test = train_test_split(features, salary_values, test_size=0.2,
-                                                                    random_state=5)
-
-        lin_model = sm.OLS(sal_train, var_train)
-        result = lin_model.fit()
-        sal_pred = result.predict(var_test)
-        mae = meanabs(sal_test, sal_pred, axis=0)
-        feature_mae_dict[subset] = mae
-    LOGGER.info(f"Finished models for combinations of length {i}")
+# List of possible features - SHG, SHP, OTG and GWG are rare, but the Gram matrix search is fast enough to include them
+possible_features = ['Signed Age', 'GP', 'G', 'A', 'P', '+/-', 'PIM', 'P/GP', 'EVG', 'EVP', 'PPG', 'PPP', 'SHG', 'SHP',
+                     'OTG', 'GWG', 'S', 'S%', 'TOI/GP', 'FOW%']
+
+# Split the data once. train_test_split shuffles the rows the same way no matter which columns are passed in, so every
+# subset of features is trained and tested on the same players as if it were split on its own.
+var_train, var_test, sal_train, sal_test = train_test_split(reg_data_df[possible_features].values, salary_values,
+                                                            test_size=0.2, random_state=5)
+
+if SEARCH_MODE == 'cv':
+    # Score every combination of features on every fold instead of on the one split above, so the best model is not
+    # picked by the luck of the split. subset_cv_mae is defined in functions.py
+    cv_df = subset_cv_mae(reg_data_df[possible_features].values, salary_values, possible_features,
+                          n_splits=CV_SPLITS, n_repeats=CV_REPEATS, workers=SEARCH_WORKERS, top_k=SEARCH_TOP_K)
+    print(cv_df)
+    feature_mae_dict = cv_df['Mean MAE'].to_dict()
+elif SEARCH_MODE == 'elastic_net':
+    # Fit the whole regularization path on standardized features and score every point of it on the same folds as
+    # SEARCH_MODE = 'cv', so the MAE can be compared with the best subsets. elastic_net_cv is defined in functions.py
+    path_df = elastic_net_cv(reg_data_df[possible_features].values, salary_values, possible_features, l1_ratio=L1_RATIO,
+                             n_splits=CV_SPLITS, n_repeats=CV_REPEATS)
+    # The largest penalties keep no features, and on weak data one of them can have the smallest MAE. Only the points
+    # that keep a feature can be refitted
+    with_features = path_df[path_df['# Features'] > 0]
+    if with_features.empty:
+        raise ValueError("The elastic net path kept no features at any penalty")
+    best_alpha = with_features['Mean MAE'].idxmin()
+    print(path_df[['Mean MAE', 'Std MAE', '# Features']].iloc[::10])
+    print(path_df.loc[best_alpha])
+    # The features the best point of the path keeps are refitted without a penalty below
+    feature_mae_dict = {tuple(feature for feature in possible_features if path_df.loc[best_alpha, feature] != 0):
+                        path_df.loc[best_alpha, 'Mean MAE']}
+elif SEARCH_MODE == 'branch_and_bound':
+    # Find the subsets of each size with the smallest training RSS, then only test those. Only the coefficients are
+    # needed here, so fit_ols skips the statsmodels results object. best_subsets_by_rss and fit_ols are defined in
+    # functions.py
+    subset_rss_dict = best_subsets_by_rss(var_train, sal_train, possible_features, n_best=SEARCH_TOP_K)
+    feature_mae_dict = {}
+    for subset in subset_rss_dict:
+        columns = [possible_features.index(feature) for feature in subset]
+        coefficients = fit_ols(var_train[:, columns], sal_train, backend=OLS_BACKEND)
+        feature_mae_dict[subset] = meanabs(sal_test, var_test[:, columns] @ coefficients, axis=0)
+else:
+    # Calculate the MAE of every combination of features. subset_regression_mae is defined in functions.py
+    top_k = SEARCH_TOP_K if SEARCH_MODE == 'top_k' else None
+    feature_mae_dict = subset_regression_mae(var_train, var_test, sal_train, sal_test, possible_features,
+                                             workers=SEARCH_WORKERS, top_k=top_k)
+LOGGER.info(f"Finished models for {len(feature_mae_dict)} combinations of features")
 
 best_features = list(min(feature_mae_dict, key=feature_mae_dict.get))
 
@@ -188,3 +209,26 @@ sal_pred = result.predict(var_test)
 
 print(result.summary())
 print("Mean Absolute Error: " + str(meanabs(sal_test, sal_pred, axis=0)))
+
+# Save the best model, so salaries can be estimated without running this script again. predict_salary takes the stats
+# cleaned or as NHL.com gives them, and does not load statsmodels or sklearn:
+#   from functions import predict_salary
+#   predict_salary(stats_df)  # stats_df has a column for each of best_features, ie. Signed Age and the summary stats
+# save_salary_model is defined in functions.py
+save_salary_model(best_features, result.params, var_train, sal_train, path=MODEL_FILE,
+                  mae=meanabs(sal_test, sal_pred, axis=0))
+LOGGER.info(f"Saved the best model to {MODEL_FILE}")
+
+"""
+PART 3: Batch Modeling #################################################################################################
+
+Refit the best features for every stats year, position and contract length, for both the AAV and the cap hit
+percentage, to see how the model changes between groups of players. All of the models are solved in one pass.
+"""
+
+# fit_ols_groups is defined in functions.py. It returns one row per grouping, group, target and feature
+batch_df = fit_ols_groups(reg_data_df, best_features, BATCH_TARGETS, BATCH_GROUPINGS)
+LOGGER.info(f"Finished {len(batch_df) // len(best_features)} batch models")
+
+print(batch_df.pivot_table(index=['Grouping', 'Group', 'Target', 'Rows', 'R2', 'MAE'], columns='Feature',
+                           values='Coefficient', sort=False)[best_features])
@@ -7,12 +7,23 @@ the same day for the KR fantasy league.
 
 # Imports and setup
 import logging as LOGGER
-import pandas as pd
-import requests
+from functions import batch_overlap_matrices, best_goalie_portfolios, fetch_team_schedules, write_non_overlapping_games
 
 LOGGER.getLogger().setLevel(LOGGER.INFO)
 
 # Configurations
+OUTPUT_FILE = 'Non Overlapping Games for 2 NHL Teams ({}).xlsx'  # filled in with the name of each window
+
+# Date windows to count games in: name -> (season, first day, last day). The season is the year it ends in and a day of
+# None means the start or end of the season. ie. the fantasy playoffs: 'Playoffs': (2022, '2022-03-21', '2022-04-10')
+WINDOWS = {'2020-2021': (2021, None, None)}
+
+# Number of goalies to pick, and whether the best picks cover the most days ('coverage') or play on the same day the
+# least ('collisions')
+GOALIES = 3
+GOALIE_OBJECTIVE = 'coverage'
+GOALIE_FILE = 'Best {} Goalie Teams ({}).xlsx'  # filled in with the number of goalies and the name of each window
+
 teams_info = [["ANA", 'https://www.espn.com/nhl/team/schedule/_/name/ana'],
               ["ARI", 'https://www.espn.com/nhl/team/schedule/_/name/ari'],
               ["BOS", 'https://www.espn.com/nhl/team/schedule/_/name/bos'],
@@ -45,61 +56,26 @@ teams_info = [["ANA", 'https://www.espn.com/nhl/team/schedule/_/name/ana'],
               ["WPG", 'https://www.espn.com/nhl/team/schedule/_/name/wpg'],
               ["WSH", 'https://www.espn.com/nhl/team/schedule/_/name/wsh']]
 
-
-def non_overlapping_games(T1, T2, url1, url2):
-    '''
-    Calculates the number of non overlapping games between two teams
-    :param T1 (str): 3 letter abbreviation of first team
-    :param T2 (str): 3 letter abbreviation of second team
-    :param url1 (str): url for the first team's schedule
-    :param url2 (str): url for the second team's schedule
-    :return: integer representing the number of non overlapping games
-    '''
-    # grab the schedules from the two teams
-    T1url = url1
-    T2url = url2
-    html1 = requests.get(T1url).content
-    html2 = requests.get(T2url).content
-    df1_list = pd.read_html(html1)
-    df2_list = pd.read_html(html2)
-    df1 = df1_list[-1]
-    df2 = df2_list[-1]
-
-    new_header = df1.iloc[0]  # grab the first row for the header
-    df1 = df1[1:]  # take the data less the header row
-    df1.columns = new_header  # set the header row as the df header
-
-    new_header = df2.iloc[0]
-    df2 = df2[1:]
-    df2.columns = new_header
-
-    dates1 = list(df1["DATE"])
-    dates2 = list(df2["DATE"])
-
-    overlapping_games = 0
-
-    # Loop through the first team's schedule to count number of overlapping games
-    for date in dates1:
-        if date in dates2:
-            overlapping_games = overlapping_games + 1
-
-    return 112 - overlapping_games  # since the season is 56 games long, 112 is the max number of non overlapping games
-
-
-columns = ["Teams", "# Non-Overlapping Games"]
-final_df = pd.DataFrame(columns=columns)
-
-# Loop through every combination of teams and store the number of non overlapping games in final_df
-for team1_info in teams_info:
-    i1 = teams_info.index(team1_info)
-    subteams = teams_info[i1 + 1:]
-    for team2_info in subteams:
-        i2 = subteams.index(team2_info)
-        df_col1 = teams_info[i1][0] + " & " + subteams[i2][0]
-        df_col2 = non_overlapping_games(teams_info[i1][0], subteams[i2][0], teams_info[i1][1], subteams[i2][1])
-        final_df = final_df.append({'Teams': df_col1, '# Non-Overlapping Games': df_col2}, ignore_index=True)
-    LOGGER.info(f"Finished {team1_info}")
-
-# Save to excel
-final_df.to_excel('Non Overlapping Games for 2 NHL Teams (2020-2021).xlsx')
-LOGGER.info(f"Finished writing dataframe to excel")
+# Download every team's schedule once for each season. fetch_team_schedules is defined in functions.py
+season_schedules = {}
+for season in sorted({season for season, _, _ in WINDOWS.values()}):
+    season_info = [[team, f"{url}/season/{season}"] for team, url in teams_info]
+    season_schedules[season] = fetch_team_schedules(season_info, season)
+    LOGGER.info(f"Finished downloading schedules for {season}")
+
+# Count the days every pair of teams both play on in each window, using one product of the team by game day matrix.
+# batch_overlap_matrices is defined in functions.py
+overlap_dfs = batch_overlap_matrices(season_schedules, WINDOWS)
+
+# Save to excel, with the full matrix of games on the same day on a second sheet. write_non_overlapping_games is defined
+# in functions.py and streams the pairs to the file, so it also works for a .csv file and for larger leagues
+for name, overlap_df in overlap_dfs.items():
+    n_pairs = write_non_overlapping_games(overlap_df, OUTPUT_FILE.format(name))
+    LOGGER.info(f"Finished writing {n_pairs} pairs of teams to excel for {name}")
+
+# Pick the goalie teams for each window. best_goalie_portfolios is defined in functions.py
+for name, (season, start, end) in WINDOWS.items():
+    portfolios_df = best_goalie_portfolios(season_schedules[season], GOALIES, season, start, end,
+                                           objective=GOALIE_OBJECTIVE)
+    portfolios_df.to_excel(GOALIE_FILE.format(GOALIES, name))
+    LOGGER.info(f"Best {GOALIES} goalie teams for {name}: {portfolios_df['Teams'].iloc[0]}")